@@ -0,0 +1,166 @@
+"""
+Rough throughput numbers for the hot paths. Run all benchmarks with
+
+    python bench.py
+
+or only some of them by name, e.g. `python bench.py signing`.
+"""
+import os
+import sys
+import time
+from random import randint, Random
+
+from block import Block
+import ecc.ecc
+from ecc.ecc import (
+    batch_verify,
+    generator_odd_multiples,
+    generator_table,
+    N,
+    pippenger_multiply,
+    PrivateKey,
+    S256Point,
+    set_backend,
+    strauss_multi_multiply,
+    to_jacobian,
+)
+from ecc.order import random_point
+from ecc.pollard import pollard_rho
+from ecc.verifier import VerifyExecutor
+import helper
+from helper import hash160, hash160_many, set_ripemd160_backend
+from miner import mine_chain, Miner
+
+
+def measure(name, function, count):
+    """Runs function, which handles count items, and prints items per second"""
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    print('{:<32} {:>12.1f} ops/s'.format(name, count / elapsed))
+
+
+def bench_signing(count=200):
+    private_key = PrivateKey(randint(1, N - 1))
+    zs = [randint(0, 2**256) for _ in range(count)]
+    measure('sign', lambda: [private_key.sign(z) for z in zs], count)
+    measure('sign_many', lambda: private_key.sign_many(zs), count)
+    keys = [PrivateKey(randint(1, N - 1)) for _ in range(10)]
+    items = [(keys[i % len(keys)], z) for i, z in enumerate(zs)]
+    measure('sign_batch (10 keys)', lambda: PrivateKey.sign_batch(items), count)
+
+
+def bench_verify(count=200):
+    items = []
+    for z in range(count):
+        private_key = PrivateKey(randint(1, N - 1))
+        items.append((private_key.point, z, private_key.sign(z)))
+    measure('verify', lambda: [p.verify(z, sig) for p, z, sig in items], count)
+    measure('batch_verify', lambda: batch_verify(items), count)
+    measure('S256Point.recover',
+            lambda: [S256Point.recover(z, sig) for _, z, sig in items], count)
+
+
+def bench_multi_multiply(sizes=(16, 32, 48, 64, 128, 256, 512)):
+    points = [to_jacobian(PrivateKey(randint(1, N - 1)).point) for _ in range(max(sizes))]
+    for n in sizes:
+        pairs = [(randint(1, N - 1), point) for point in points[:n]]
+        measure('strauss_multi_multiply [n={}]'.format(n),
+                lambda: strauss_multi_multiply(pairs), n)
+        measure('pippenger_multiply [n={}]'.format(n),
+                lambda: pippenger_multiply(pairs), n)
+
+
+def bench_backends(count=100):
+    original = ecc.ecc.BACKEND
+    private_key = PrivateKey(randint(1, N - 1))
+    zs = [randint(0, 2**256) for _ in range(count)]
+    sigs = [private_key.sign(z) for z in zs]
+    point = private_key.point
+    secs = [PrivateKey(randint(1, N - 1)).point.sec() for _ in range(count)]
+    for name in ('python', 'gmpy2'):
+        try:
+            set_backend(name)
+        except ImportError:
+            print('{} backend is not installed'.format(name))
+            continue
+        generator_table()
+        generator_odd_multiples()
+        measure('sign [{}]'.format(name),
+                lambda: [private_key.sign(z) for z in zs], count)
+        measure('verify [{}]'.format(name),
+                lambda: [point.verify(z, sig) for z, sig in zip(zs, sigs)], count)
+        measure('parse compressed sec [{}]'.format(name),
+                lambda: [S256Point.parse_uncached(sec) for sec in secs], count)
+    set_backend(original)
+
+
+def bench_executor(count=400):
+    jobs = []
+    for z in range(count):
+        private_key = PrivateKey(randint(1, N - 1))
+        jobs.append((private_key.point.sec(), private_key.sign(z).der(), z))
+    for batch in (False, True):
+        with VerifyExecutor(batch=batch) as executor:
+            measure('VerifyExecutor [{} cores{}]'.format(
+                executor.workers, ', batch' if batch else ''),
+                lambda: executor.verify(jobs), count)
+
+
+def bench_hash160(count=5000):
+    original = helper.RIPEMD160_BACKEND
+    items = [os.urandom(33) for _ in range(count)]
+    for name in ('openssl', 'python'):
+        try:
+            set_ripemd160_backend(name)
+        except ValueError:
+            print('{} RIPEMD-160 is not available'.format(name))
+            continue
+        measure('hash160 [{}]'.format(name), lambda: [hash160(s) for s in items], count)
+        measure('hash160_many [{}]'.format(name), lambda: hash160_many(items), count)
+    set_ripemd160_backend(original)
+
+
+def bench_mining(count=2000):
+    measure('mine_chain (regtest)', lambda: mine_chain(count), count)
+    # about 2^20 hashes per block
+    block = Block(0x20000000, b'\x00' * 32, b'\x01' * 32, 1500000000,
+                  bytes.fromhex('ffff0f1e'), b'\x00' * 4)
+    with Miner() as miner:
+        miner.mine(block)
+        print('{:<32} {:>12.1f} hashes/s ({:.1f}/s/core, {} cores)'.format(
+            'Miner.mine', miner.hash_rate(), miner.hash_rate_per_core(), miner.workers))
+
+
+def bench_rho():
+    # y^2 = x^3 + 7 over this 32-bit field has a prime number of points
+    prime, order = 4294968199, 4295016211
+    rng = Random(0)
+    point = random_point(0, 7, prime, rng)
+    target = rng.randrange(1, order) * point
+    for workers in sorted({1, os.cpu_count() or 1}):
+        _, stats = pollard_rho(point, target, order=order, workers=workers)
+        print('{:<32} {:>12.1f} it/s/core ({:.2f}s)'.format(
+            'pollard_rho [{} cores]'.format(workers),
+            stats['rate_per_core'], stats['seconds']))
+
+
+BENCHMARKS = {
+    'signing': bench_signing,
+    'verify': bench_verify,
+    'multi_multiply': bench_multi_multiply,
+    'backends': bench_backends,
+    'executor': bench_executor,
+    'hash160': bench_hash160,
+    'mining': bench_mining,
+    'rho': bench_rho,
+}
+
+
+if __name__ == '__main__':
+    # table building is a one-off cost, keep it out of the numbers
+    generator_table()
+    generator_odd_multiples()
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
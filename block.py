@@ -1,7 +1,11 @@
+from io import BytesIO
+from unittest import TestCase
+
 from helper import (
     hash256,
     int_to_little_endian,
-    little_endian_to_int
+    little_endian_to_int,
+    SHA256Midstate,
 )
 
 class Block:
@@ -38,6 +42,23 @@ class Block:
         h256 = hash256(serial)
         return h256[::-1]
 
+    def midstate(self):
+        """
+        SHA-256 state after the first 64 header bytes (version, prev_block
+        and most of merkle_root), which stay fixed while searching nonces
+        """
+        return SHA256Midstate(self.serialize()[:64])
+
+    def nonce_hashes(self, nonces, midstate=None):
+        """
+        Returns hash256 of the header with each 4-byte nonce, in the raw
+        byte order that check_pow reads, finishing from the midstate
+        """
+        if midstate is None:
+            midstate = self.midstate()
+        tail = self.serialize()[64:76]
+        return midstate.hash256_many([tail + nonce for nonce in nonces])
+
     def bip9(self):
         return self.version >> 29 == 0b001
 
@@ -55,9 +76,22 @@ class Block:
 
     def difficulty(self):
         min_target = 0xffff * pow(256, 0x1d - 3)
-        return min_target / target
+        return min_target / self.bits_to_target()
 
     def check_pow(self):
         h256 = hash256(self.serialize())
         work = little_endian_to_int(h256)
-        return work < self.target()
+        return work < self.bits_to_target()
+
+
+class BlockTest(TestCase):
+
+    def test_nonce_hashes(self):
+        raw = bytes.fromhex('020000208ec39428b17323fa0ddec8e887b4a7c53b8c0a0a220cfd0000000000000000005b0750fce0a889502d40508d39576821155e9c9e3f5c3157f961db38fd8b25be1e77a759e93c0118a4ffd71d')
+        block = Block.parse(BytesIO(raw))
+        nonces = [bytes([i, 0, 0, 0]) for i in range(5)] + [block.nonce]
+        expected = [hash256(raw[:76] + nonce) for nonce in nonces]
+        self.assertEqual(block.nonce_hashes(nonces), expected)
+        self.assertEqual(block.nonce_hashes(nonces, block.midstate()), expected)
+        self.assertEqual(expected[-1][::-1], block.hash())
+        self.assertTrue(block.check_pow())
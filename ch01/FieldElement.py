@@ -1,12 +1,24 @@
 from unittest import TestCase
 
 class FieldElement:
+    """
+    Field elements are immutable and hashable, so they can be used as dict
+    keys. __slots__ keeps each instance down to its two ints.
+    """
+    __slots__ = ('num', 'prime')
+
     def __init__(self, num, prime):
         if num >= prime or num < 0:
             error = 'Num {} not in field range 0 to {}'.format(num, prime-1)
             raise ValueError(error)
-        self.num = num
-        self.prime = prime
+        object.__setattr__(self, 'num', num)
+        object.__setattr__(self, 'prime', prime)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return (self.__class__, (self.num, self.prime))
 
     def __repr__(self):
         return 'FieldElement_{}({})'.format(self.prime, self.num)
@@ -16,6 +28,9 @@ class FieldElement:
             return False
         return self.num == other.num and self.prime == other.prime
 
+    def __hash__(self):
+        return hash((self.num, self.prime))
+
     def __ne__(self, other):
         """
         if other is None:
@@ -4,21 +4,36 @@ y^2 = x^3 + ax + b
 """
 
 class Point:
+    """
+    Points are immutable and hashable like the field elements they are made
+    of, and use __slots__ instead of a per-instance __dict__.
+    """
+    __slots__ = ('x', 'y', 'a', 'b')
+
     def __init__(self, x, y, a, b):
-        self.a = a
-        self.b = b
-        self.x = x
-        self.y = y
+        object.__setattr__(self, 'a', a)
+        object.__setattr__(self, 'b', b)
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
         if self.x == None and self.y == None:
             return
         if self.y**2 != self.x**3 + a * x + b:
             raise ValueError('({}, {}) is not on the curve; \
                              {} != {}'.format(x, y, y**2, self.x**3 +a*x+b))
 
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return (self.__class__, (self.x, self.y, self.a, self.b))
+
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y \
             and self.a == other.a and self.b == other.b
 
+    def __hash__(self):
+        return hash((self.x, self.y, self.a, self.b))
+
     def __ne__(self, other):
         return not self == other
 
@@ -28,9 +43,9 @@ class Point:
                             .format(self, other))
         elif self.x is None:
             return other
-        elif self.y is None:
+        elif other.x is None:
             return self
-        elif self.x == other.x:
+        elif self.x == other.x and self.y != other.y:
             return self.__class__(None, None, self.a, self.b)
         elif self != other:
             x1, y1, x2, y2 = (self.x, self.y, other.x, other.y)
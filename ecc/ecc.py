@@ -1,15 +1,79 @@
-from random import randint
+from collections import OrderedDict
+from io import BytesIO
+import hashlib
+import hmac
+import os
+import pickle
+from random import randint, SystemRandom
+import sys
 from unittest import TestCase
 
-from helper import encode_base58_checksum, hash160, little_endian_to_int
+from helper import (
+    encode_base58_checksum,
+    h160_to_p2wpkh_address,
+    hash160,
+    little_endian_to_int,
+)
+
+# Big-integer backend. 'python' (the default) uses builtin ints. 'gmpy2' runs
+# the Jacobian coordinate arithmetic on gmpy2.mpz and uses its powmod and
+# invert. 'auto' picks gmpy2 when it is installed. Choose with the ECC_BACKEND
+# environment variable at import time, or call set_backend() later. Whatever
+# the backend, powmod and invert return builtin ints, and mpz values never
+# leave the Jacobian layer.
+BACKEND = None
+
+def _python_invert(num, prime):
+    # 0 has no inverse; return 0 the way Fermat's num^(p-2) does
+    if num % prime == 0:
+        return 0
+    return pow(num, -1, prime)
+
+def _select_backend(name):
+    global BACKEND, to_number, powmod, invert
+    if name == 'auto':
+        try:
+            import gmpy2
+            name = 'gmpy2'
+        except ImportError:
+            name = 'python'
+    if name == 'python':
+        to_number = int
+        powmod = pow
+        invert = _python_invert
+    elif name == 'gmpy2':
+        try:
+            import gmpy2
+        except ImportError:
+            raise ImportError('the gmpy2 backend needs the gmpy2 package')
+        to_number = gmpy2.mpz
+        powmod = lambda base, exponent, modulus: int(gmpy2.powmod(base, exponent, modulus))
+        invert = lambda num, prime: int(gmpy2.invert(num, prime)) if num % prime else 0
+    else:
+        raise ValueError('unknown backend {}'.format(name))
+    BACKEND = name
+
+_select_backend(os.environ.get('ECC_BACKEND', 'python'))
 
 class FieldElement:
+    """
+    Field elements are immutable and hashable, so they can be used as dict
+    keys. __slots__ keeps each instance down to its two ints.
+    """
+    __slots__ = ('num', 'prime')
+
     def __init__(self, num, prime):
         if num >= prime or num < 0:
             error = 'Num {} not in field range 0 to {}'.format(num, prime-1)
             raise ValueError(error)
-        self.num = num
-        self.prime = prime
+        object.__setattr__(self, 'num', num)
+        object.__setattr__(self, 'prime', prime)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return (self.__class__, (self.num, self.prime))
 
     def __repr__(self):
         return 'FieldElement_{}({})'.format(self.prime, self.num)
@@ -19,6 +83,9 @@ class FieldElement:
             return False
         return self.num == other.num and self.prime == other.prime
 
+    def __hash__(self):
+        return hash((self.num, self.prime))
+
     def __ne__(self, other):
         """
         if other is None:
@@ -82,7 +149,7 @@ class FieldElement:
         """
         # We can turn a negative exp into a positive one with moddiv
         n = exponent % (self.prime - 1)
-        num = pow(self.num, n, self.prime)
+        num = powmod(self.num, n, self.prime)
         return self.__class__(num, self.prime)
 
     def __truediv__(self, other):
@@ -97,10 +164,12 @@ class FieldElement:
         b^-1 = b^(p-2)
         a /f(b) = a *f(b^-1) ->
         a *f(b^(p-2)); this is what we use to define finite field division
+
+        The backend's invert finds the same b^-1 without the exponentiation.
         """
         if self.prime != other.prime:
             raise TypeError('Cannot divide two numbers in different fields')
-        num = (self.num * pow(other.num, self.prime-2, self.prime)) % self.prime
+        num = (self.num * invert(other.num, self.prime)) % self.prime
         return self.__class__(num, self.prime)
 
 class FieldElementTest(TestCase):
@@ -153,21 +222,36 @@ class FieldElementTest(TestCase):
 
 
 class Point:
+    """
+    Points are immutable and hashable like the field elements they are made
+    of, and use __slots__ instead of a per-instance __dict__.
+    """
+    __slots__ = ('x', 'y', 'a', 'b')
+
     def __init__(self, x, y, a, b):
-        self.a = a
-        self.b = b
-        self.x = x
-        self.y = y
+        object.__setattr__(self, 'a', a)
+        object.__setattr__(self, 'b', b)
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
         if self.x == None and self.y == None:
             return
         if self.y**2 != self.x**3 + a * x + b:
             raise ValueError('({}, {}) is not on the curve; \
                              {} != {}'.format(x, y, y**2, self.x**3 +a*x+b))
 
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is immutable'.format(self.__class__.__name__))
+
+    def __reduce__(self):
+        return (self.__class__, (self.x, self.y, self.a, self.b))
+
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y \
             and self.a == other.a and self.b == other.b
 
+    def __hash__(self):
+        return hash((self.x, self.y, self.a, self.b))
+
     def __ne__(self, other):
         return not self == other
 
@@ -177,7 +261,7 @@ class Point:
                             .format(self, other))
         elif self.x is None:
             return other
-        elif self.y is None:
+        elif other.x is None:
             return self
         elif self.x == other.x and self.y != other.y:
             return self.__class__(None, None, self.a, self.b)
@@ -219,6 +303,22 @@ class Point:
 
 class ECCTest(TestCase):
 
+    def test_hashable(self):
+        prime = 223
+        a = FieldElement(0, prime)
+        b = FieldElement(7, prime)
+        p1 = Point(FieldElement(192, prime), FieldElement(105, prime), a, b)
+        p2 = Point(FieldElement(192, prime), FieldElement(105, prime), a, b)
+        infinity = Point(None, None, a, b)
+        self.assertEqual(len({p1, p2, infinity}), 2)
+        self.assertEqual({a: 1}[FieldElement(0, prime)], 1)
+        with self.assertRaises(AttributeError):
+            p1.x = a
+        with self.assertRaises(AttributeError):
+            a.num = 1
+        self.assertFalse(hasattr(p1, '__dict__'))
+        self.assertFalse(hasattr(a, '__dict__'))
+
     def test_on_curve(self):
         prime = 223
         a = FieldElement(0, prime)
@@ -253,38 +353,736 @@ class ECCTest(TestCase):
 P = 2**256 - 2**32 - 977
 
 class S256Field(FieldElement):
+    """
+    Field elements modulo P. Values coming from outside are range-checked in
+    __init__, while results of arithmetic are already reduced modulo P and go
+    through _unchecked instead.
+    """
+
+    __slots__ = ()
 
     def __init__(self, num, prime=None):
         super().__init__(num=num, prime=P)
 
+    @classmethod
+    def _unchecked(cls, num):
+        """Builds an element from an int already reduced modulo P"""
+        element = cls.__new__(cls)
+        object.__setattr__(element, 'num', num)
+        object.__setattr__(element, 'prime', P)
+        return element
+
     def __repr__(self):
         return '{:x}'.format(self.num).zfill(64)
 
+    def __add__(self, other):
+        if not isinstance(other, S256Field):
+            return super().__add__(other)
+        return S256Field._unchecked((self.num + other.num) % P)
+
+    def __sub__(self, other):
+        if not isinstance(other, S256Field):
+            return super().__sub__(other)
+        return S256Field._unchecked((self.num - other.num) % P)
+
+    def __mul__(self, other):
+        if not isinstance(other, S256Field):
+            return super().__mul__(other)
+        return S256Field._unchecked(self.num * other.num % P)
+
+    def __rmul__(self, coefficient):
+        return S256Field._unchecked(self.num * coefficient % P)
+
+    def __pow__(self, exponent):
+        return S256Field._unchecked(powmod(self.num, exponent % (P - 1), P))
+
+    def __truediv__(self, other):
+        if not isinstance(other, S256Field):
+            return super().__truediv__(other)
+        return S256Field._unchecked(self.num * invert(other.num, P) % P)
+
     def sqrt(self):
         return self ** ((P + 1) // 4)
 
+def invert_many(nums, prime):
+    """
+    Inverts every num modulo prime with Montgomery's trick: one modular
+    inversion (the backend's invert) plus three multiplications per num
+    instead of one inversion each. Zeros map to 0, like division by zero
+    does in FieldElement.
+    """
+    prefixes = []
+    product = 1
+    for num in nums:
+        prefixes.append(product)
+        if num:
+            product = product * num % prime
+    inverse = invert(product, prime)
+    result = [0] * len(nums)
+    for i in range(len(nums) - 1, -1, -1):
+        if nums[i]:
+            result[i] = inverse * prefixes[i] % prime
+            inverse = inverse * nums[i] % prime
+    return result
+
+def batch_inverse(elements):
+    """Returns the inverses of a list of field elements from the same field"""
+    if not elements:
+        return []
+    prime = elements[0].prime
+    inverses = invert_many([element.num for element in elements], prime)
+    return [element.__class__(num, prime) for element, num in zip(elements, inverses)]
+
 A = 0
 B = 7
 N = 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141
+# shared curve coefficients so that building a point does not rebuild them
+FIELD_A = S256Field(A)
+FIELD_B = S256Field(B)
+
+# Jacobian coordinates represent the affine point (x, y) as the triple
+# (X, Y, Z) with x = X/Z^2 and y = Y/Z^3. Addition and doubling then need no
+# division, so a whole scalar multiplication only pays for one inversion when
+# converting back to affine at the end. The triples are plain ints modulo P
+# and Z == 0 is the point at infinity.
+JACOBIAN_INFINITY = (0, 1, 0)
+
+def jacobian_double(p1):
+    """Doubles a Jacobian point on y^2 = x^3 + 7 (dbl-2009-l, a = 0)"""
+    x1, y1, z1 = p1
+    if z1 == 0 or y1 == 0:
+        return JACOBIAN_INFINITY
+    a = x1 * x1 % P
+    b = y1 * y1 % P
+    c = b * b % P
+    d = 2 * ((x1 + b) * (x1 + b) - a - c) % P
+    e = 3 * a % P
+    x3 = (e * e - 2 * d) % P
+    y3 = (e * (d - x3) - 8 * c) % P
+    z3 = 2 * y1 * z1 % P
+    return (x3, y3, z3)
+
+def jacobian_add(p1, p2):
+    """Adds two Jacobian points (add-1998-cmo-2)"""
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    if z1 == 0:
+        return p2
+    if z2 == 0:
+        return p1
+    if z2 == 1:
+        return jacobian_add_mixed(p1, p2)
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    u2 = x2 * z1z1 % P
+    s1 = y1 * z2 * z2z2 % P
+    s2 = y2 * z1 * z1z1 % P
+    h = (u2 - u1) % P
+    r = (s2 - s1) % P
+    if h == 0:
+        # same x means either the same point or its negation
+        if r == 0:
+            return jacobian_double(p1)
+        return JACOBIAN_INFINITY
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    z3 = z1 * z2 * h % P
+    return (x3, y3, z3)
+
+def jacobian_add_mixed(p1, p2):
+    """Adds a Jacobian point and a normalized (Z == 1) one (add-1998-cmo-2 with Z2 = 1)"""
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    if z1 == 0:
+        return p2
+    z1z1 = z1 * z1 % P
+    u2 = x2 * z1z1 % P
+    s2 = y2 * z1 * z1z1 % P
+    h = (u2 - x1) % P
+    r = (s2 - y1) % P
+    if h == 0:
+        if r == 0:
+            return jacobian_double(p1)
+        return JACOBIAN_INFINITY
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - y1 * hhh) % P
+    z3 = z1 * h % P
+    return (x3, y3, z3)
+
+def jacobian_multiply(p1, coefficient):
+    """Double-and-add scalar multiplication that stays in Jacobian form"""
+    coef = coefficient
+    current = p1
+    result = JACOBIAN_INFINITY
+    while coef:
+        if coef & 1:
+            result = jacobian_add(result, current)
+        current = jacobian_double(current)
+        coef >>= 1
+    return result
+
+def jacobian_equal(p1, p2):
+    """Compares two Jacobian points without normalizing either"""
+    x1, y1, z1 = p1
+    x2, y2, z2 = p2
+    if z1 == 0 or z2 == 0:
+        return z1 == z2
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    return x1 * z2z2 % P == x2 * z1z1 % P \
+        and y1 * z2 * z2z2 % P == y2 * z1 * z1z1 % P
+
+def jacobian_negate(p1):
+    """Negates a Jacobian point by flipping Y"""
+    x1, y1, z1 = p1
+    return (x1, -y1 % P, z1)
+
+# Window width for variable-base multiplication. A width-w NAF has on average
+# one nonzero digit every w+1 bits, at the cost of precomputing 2^(w-2) odd
+# multiples of the base point.
+WNAF_WIDTH = 4
+
+def wnaf(coefficient, width):
+    """Returns the width-w NAF digits of coefficient, least significant first"""
+    if width < 2:
+        raise ValueError('wNAF width must be at least 2, got {}'.format(width))
+    if coefficient < 0:
+        return [-digit for digit in wnaf(-coefficient, width)]
+    full = 1 << width
+    half = full >> 1
+    digits = []
+    coef = coefficient
+    while coef:
+        if coef & 1:
+            digit = coef & (full - 1)
+            if digit >= half:
+                digit -= full
+            coef -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        coef >>= 1
+    return digits
+
+def odd_multiples(p1, width):
+    """Returns [p1, 3*p1, 5*p1, ...] up to (2^(w-1) - 1) * p1"""
+    double = jacobian_double(p1)
+    odd = [p1]
+    for _ in range(1, 1 << (width - 2)):
+        odd.append(jacobian_add(odd[-1], double))
+    return odd
+
+def strauss_multiply(terms):
+    """
+    Sums several scalar multiplications at once (Strauss/Shamir's trick).
+    Each term is a pair of (odd_multiples of a point, wNAF digits of its
+    scalar) and all terms share a single chain of doublings.
+    """
+    # gather the additions for each bit position before running the chain
+    length = max([len(digits) for _, digits in terms] + [0])
+    additions = [[] for _ in range(length)]
+    for odd, digits in terms:
+        for i, digit in enumerate(digits):
+            if digit > 0:
+                additions[i].append(odd[digit >> 1])
+            elif digit < 0:
+                additions[i].append(jacobian_negate(odd[-digit >> 1]))
+    result = JACOBIAN_INFINITY
+    for points in reversed(additions):
+        result = jacobian_double(result)
+        for point in points:
+            result = jacobian_add(result, point)
+    return result
+
+# GLV endomorphism: (x, y) -> (BETA*x, y) is the same as multiplying by LAMBDA,
+# so k*P can be split into k1*P + k2*(LAMBDA*P) with k1 and k2 about half as
+# long as k. Both halves then run on a doubling chain half as long. It is off
+# by default; turn it on with ECC_GLV=1 in the environment at import time, or
+# call set_glv() later.
+BETA = 0x7ae96a2b657c07106e64479eac3434e99cf0497512f58995c1396c28719501ee
+LAMBDA = 0x5363ad4cc05c30e0a5261c028812645a122e22ea20816678df02967c1b23bd72
+# short basis of the lattice {(a, b): a + b*LAMBDA = 0 mod N}
+GLV_A1 = 0x3086d221a7d46bcde86c90e49284eb15
+GLV_B1 = -0xe4437ed6010e88286f547fa90abfe4c3
+GLV_A2 = 0x114ca50f7a8e2f3f657c1108d9d44cfd8
+GLV_B2 = GLV_A1
+USE_GLV = os.environ.get('ECC_GLV', '0') not in ('', '0')
+
+def set_glv(enabled):
+    """Turns the GLV split of scalar multiplications on or off"""
+    global USE_GLV
+    USE_GLV = bool(enabled)
+
+def glv_split(coefficient):
+    """Returns (k1, k2) with k1 + k2*LAMBDA = coefficient mod N, each ~128 bits"""
+    k = coefficient % N
+    # round(b2*k/N) and round(-b1*k/N)
+    c1 = (GLV_B2 * k + N // 2) // N
+    c2 = (-GLV_B1 * k + N // 2) // N
+    k1 = k - c1 * GLV_A1 - c2 * GLV_A2
+    k2 = -c1 * GLV_B1 - c2 * GLV_B2
+    return k1, k2
+
+def jacobian_endomorphism(p1):
+    """Maps a Jacobian point to LAMBDA times itself"""
+    x1, y1, z1 = p1
+    return (BETA * x1 % P, y1, z1)
+
+def scalar_terms(coefficient, p1, width, odd=None):
+    """
+    Returns the strauss_multiply terms for coefficient*p1, split in two by
+    GLV when USE_GLV is set. odd can pass in precomputed odd multiples.
+    """
+    if odd is None:
+        odd = odd_multiples(p1, width)
+    if not USE_GLV:
+        return [(odd, wnaf(coefficient, width))]
+    k1, k2 = glv_split(coefficient)
+    odd_lambda = [jacobian_endomorphism(point) for point in odd]
+    return [(odd, wnaf(k1, width)), (odd_lambda, wnaf(k2, width))]
+
+def jacobian_multiply_wnaf(p1, coefficient, width=None):
+    """Scalar multiplication using the width-w NAF of coefficient"""
+    if width is None:
+        width = WNAF_WIDTH
+    return strauss_multiply(scalar_terms(coefficient, p1, width))
+
+def jacobian_double_multiply(coef1, p1, coef2, p2, width=None):
+    """
+    Computes coef1*p1 + coef2*p2 with one shared doubling chain. A G operand
+    uses the precomputed, normalized odd multiples of G.
+    """
+    if width is None:
+        width = WNAF_WIDTH
+    g = to_jacobian(G)
+    terms = []
+    for coef, point in ((coef1, p1), (coef2, p2)):
+        if point == g:
+            terms += scalar_terms(coef, point, G_WNAF_WIDTH, generator_odd_multiples())
+        else:
+            terms += scalar_terms(coef, point, width)
+    return strauss_multiply(terms)
+
+# Pippenger's bucket method: every scalar is cut into signed c-bit digits and,
+# window by window, each point is dropped into the bucket for its digit. The
+# buckets are then summed with weights using running sums. Per point that is
+# one addition per window, so cost per point shrinks as n grows. Below
+# PIPPENGER_THRESHOLD normalized points Strauss is faster (`python bench.py
+# multi_multiply` shows the crossover).
+PIPPENGER_THRESHOLD = 48
+
+def pippenger_window(n):
+    """Picks the digit width with the fewest estimated additions for n points"""
+    best_window, best_cost = 1, None
+    for window in range(1, 17):
+        cost = (256 // window + 1) * (n + (1 << window))
+        if best_cost is None or cost < best_cost:
+            best_window, best_cost = window, cost
+    return best_window
+
+def signed_digits(coefficient, window):
+    """Splits coefficient into base 2^window digits in [-2^(w-1), 2^(w-1)]"""
+    full = 1 << window
+    half = full >> 1
+    digits = []
+    coef = coefficient
+    while coef:
+        digit = coef & (full - 1)
+        if digit > half:
+            digit -= full
+        digits.append(digit)
+        coef = (coef - digit) >> window
+    return digits
+
+def pippenger_multiply(pairs, window=None):
+    """Computes the sum of coefficient*point over (coefficient, point) pairs"""
+    if window is None:
+        window = pippenger_window(len(pairs))
+    half = 1 << (window - 1)
+    entries = [(point, jacobian_negate(point), signed_digits(coef % N, window))
+               for coef, point in pairs]
+    length = max([len(digits) for _, _, digits in entries] + [0])
+    result = JACOBIAN_INFINITY
+    for i in range(length - 1, -1, -1):
+        for _ in range(window):
+            result = jacobian_double(result)
+        buckets = [JACOBIAN_INFINITY] * (half + 1)
+        for point, negated, digits in entries:
+            if i >= len(digits):
+                continue
+            digit = digits[i]
+            if digit > 0:
+                buckets[digit] = jacobian_add(buckets[digit], point)
+            elif digit < 0:
+                buckets[-digit] = jacobian_add(buckets[-digit], negated)
+        # sum of b * buckets[b]: bucket b is picked up by b running sums
+        running = JACOBIAN_INFINITY
+        total = JACOBIAN_INFINITY
+        for bucket in reversed(buckets[1:]):
+            running = jacobian_add(running, bucket)
+            total = jacobian_add(total, running)
+        result = jacobian_add(result, total)
+    return result
+
+def strauss_multi_multiply(pairs):
+    """Computes the sum of coefficient*point over (coefficient, point) pairs with Strauss"""
+    terms = []
+    for coef, point in pairs:
+        terms += scalar_terms(coef % N, point, WNAF_WIDTH)
+    return strauss_multiply(terms)
+
+def jacobian_multi_multiply(pairs):
+    """
+    Computes the sum of coefficient*point over (coefficient, point) pairs of
+    Jacobian points, with Strauss for small inputs and Pippenger otherwise.
+    """
+    if len(pairs) < PIPPENGER_THRESHOLD:
+        return strauss_multi_multiply(pairs)
+    return pippenger_multiply(pairs)
+
+def multi_multiply(pairs):
+    """Returns the S256Point sum of coefficient*point over (coefficient, S256Point) pairs"""
+    return from_jacobian(jacobian_multi_multiply(
+        [(coef, to_jacobian(point)) for coef, point in pairs]))
+
+def to_jacobian(point):
+    """Lifts an affine S256Point to a Jacobian triple"""
+    if point.x is None:
+        return JACOBIAN_INFINITY
+    return (to_number(point.x.num), to_number(point.y.num), 1)
+
+def lift_x(x):
+    """Returns the normalized Jacobian point with x and an even y, or None"""
+    alpha = (pow(x, 3, P) + B) % P
+    beta = powmod(alpha, (P + 1) // 4, P)
+    if beta * beta % P != alpha:
+        return None
+    if beta % 2:
+        beta = P - beta
+    return (x, beta, 1)
+
+def jacobian_normalize(p1):
+    """Rescales a Jacobian triple so that Z == 1"""
+    x1, y1, z1 = p1
+    if z1 == 0 or z1 == 1:
+        return p1
+    z_inv = invert(z1, P)
+    z_inv2 = z_inv * z_inv % P
+    return (x1 * z_inv2 % P, y1 * z_inv2 * z_inv % P, 1)
+
+def jacobian_normalize_many(points):
+    """Rescales a list of Jacobian triples to Z == 1 with a single inversion"""
+    z_invs = invert_many([z1 for _, _, z1 in points], P)
+    result = []
+    for (x1, y1, z1), z_inv in zip(points, z_invs):
+        if z1 == 0:
+            result.append(JACOBIAN_INFINITY)
+            continue
+        z_inv2 = z_inv * z_inv % P
+        result.append((x1 * z_inv2 % P, y1 * z_inv2 * z_inv % P, 1))
+    return result
+
+def from_jacobian(p1):
+    """Converts a Jacobian triple back to an affine S256Point"""
+    x1, y1, z1 = jacobian_normalize(p1)
+    if z1 == 0:
+        return S256Point(None, None)
+    return S256Point._unchecked(int(x1), int(y1))
+
+def from_jacobian_many(points):
+    """Converts a list of Jacobian triples to affine S256Points in bulk"""
+    return [S256Point(None, None) if z1 == 0 else S256Point._unchecked(int(x1), int(y1))
+            for x1, y1, z1 in jacobian_normalize_many(points)]
+
+# Fixed-base tables: row i holds d * 2^(w*i) * P for every w-bit digit d, so
+# k*P is one mixed addition per nonzero digit of k and no doublings at all.
+# The table for G is built on first use, normalized in one batch and shared by
+# every later multiplication.
+G_WINDOW_BITS = 6
+_G_TABLE = []
+
+def fixed_base_table(p1, window):
+    """Returns the normalized fixed-base table of p1 for window-bit digits"""
+    size = 1 << window
+    entries = []
+    base = p1
+    for _ in range(0, 256, window):
+        row = [JACOBIAN_INFINITY, base]
+        for _ in range(2, size):
+            row.append(jacobian_add(row[-1], base))
+        entries += row
+        base = jacobian_add(row[-1], base)
+    entries = jacobian_normalize_many(entries)
+    return [entries[start:start + size] for start in range(0, len(entries), size)]
+
+def fixed_base_multiply(table, coefficient):
+    """Computes coefficient times the table's base point in Jacobian form"""
+    window = len(table[0]).bit_length() - 1
+    coef = coefficient % N
+    mask = (1 << window) - 1
+    result = JACOBIAN_INFINITY
+    row = 0
+    while coef:
+        digit = coef & mask
+        if digit:
+            result = jacobian_add_mixed(result, table[row][digit])
+        coef >>= window
+        row += 1
+    return result
+
+def generator_table():
+    """Returns the fixed-base table of G multiples, building it once"""
+    if not _G_TABLE:
+        _G_TABLE.extend(fixed_base_table(to_jacobian(G), G_WINDOW_BITS))
+    return _G_TABLE
+
+# G's odd multiples for the interleaved verify path are built once and
+# normalized, so a wider window than WNAF_WIDTH pays off
+G_WNAF_WIDTH = 7
+_G_ODD_MULTIPLES = []
+
+def generator_odd_multiples():
+    """Returns the normalized odd multiples of G for width G_WNAF_WIDTH"""
+    if not _G_ODD_MULTIPLES:
+        odd = odd_multiples(to_jacobian(G), G_WNAF_WIDTH)
+        _G_ODD_MULTIPLES.extend(jacobian_normalize_many(odd))
+    return _G_ODD_MULTIPLES
+
+def generator_multiply(coefficient):
+    """Computes coefficient*G in Jacobian form from the fixed-base table"""
+    return fixed_base_multiply(generator_table(), coefficient)
+
+class LRUCache:
+    """
+    Size-bounded least-recently-used cache with hit/miss counters. A capacity
+    of 0 turns caching off.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the cached value for key or None"""
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def resize(self, capacity):
+        """Changes the capacity, evicting the oldest entries if needed"""
+        self.capacity = capacity
+        while len(self.entries) > max(capacity, 0):
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            'size': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+# parsed public keys by SEC bytes; decompression costs a square root and the
+# same keys come back again and again in op_checksig/op_checkmultisig
+SEC_CACHE = LRUCache(capacity=10000)
+
+def table_memory(table):
+    """Estimates the bytes held by a fixed-base table"""
+    total = sys.getsizeof(table)
+    for row in table:
+        total += sys.getsizeof(row)
+        for x, y, _ in row:
+            total += sys.getsizeof((x, y, 1)) + sys.getsizeof(x) + sys.getsizeof(y)
+    return total
+
+class KeyTableCache:
+    """
+    Fixed-base tables for public keys that get verified often. A key gets a
+    table once it has been looked up threshold times. Tables are evicted
+    least recently used first, to stay under memory_budget bytes. Use counts
+    are kept for at most tracked_keys keys.
+    """
+
+    def __init__(self, memory_budget=64 * 2**20, threshold=32, window=4,
+                 tracked_keys=100000):
+        self.memory_budget = memory_budget
+        self.threshold = threshold
+        self.window = window
+        self.tracked_keys = tracked_keys
+        self.tables = OrderedDict()
+        self.uses = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def lookup(self, point):
+        """Returns the table for point, building it at the threshold, or None"""
+        if self.memory_budget <= 0 or point.x is None:
+            return None
+        entry = self.tables.get(point)
+        if entry is not None:
+            self.hits += 1
+            self.tables.move_to_end(point)
+            return entry[0]
+        self.misses += 1
+        uses = self.uses.pop(point, 0) + 1
+        if uses < self.threshold:
+            self.uses[point] = uses
+            while len(self.uses) > self.tracked_keys:
+                self.uses.popitem(last=False)
+            return None
+        table = fixed_base_table(to_jacobian(point), self.window)
+        size = table_memory(table)
+        self.builds += 1
+        if size <= self.memory_budget:
+            self.tables[point] = (table, size)
+            self.memory += size
+            while self.memory > self.memory_budget:
+                _, (_, evicted) = self.tables.popitem(last=False)
+                self.memory -= evicted
+                self.evictions += 1
+        return table
+
+    def clear(self):
+        self.tables.clear()
+        self.uses.clear()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            'tables': len(self.tables),
+            'tracked_keys': len(self.uses),
+            'memory': self.memory,
+            'memory_budget': self.memory_budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'builds': self.builds,
+            'evictions': self.evictions,
+        }
+
+KEY_TABLES = KeyTableCache()
+
+def set_backend(name):
+    """
+    Switches big-integer arithmetic to 'python', 'gmpy2' or 'auto' and drops
+    the precomputed tables so that they get rebuilt with the new numbers.
+    """
+    _select_backend(name)
+    del _G_TABLE[:]
+    del _G_ODD_MULTIPLES[:]
+    KEY_TABLES.clear()
 
 class S256Point(Point):
+    """
+    Points on secp256k1. S256Point(...) and parse check that the point is on
+    the curve. Points produced internally from Jacobian arithmetic are on the
+    curve by construction and skip the check through _unchecked.
+    """
+
+    __slots__ = ()
+
     def __init__(self, x, y, a=None, b=None):
-        a, b = S256Field(A), S256Field(B)
+        a, b = FIELD_A, FIELD_B
         if type(x) == int:
             super().__init__(x=S256Field(x), y=S256Field(y), a=a, b=b)
         else:
             super().__init__(x=x, y=y, a=a, b=b)
 
+    @classmethod
+    def _unchecked(cls, x, y):
+        """Builds a point from ints modulo P known to satisfy the curve"""
+        point = cls.__new__(cls)
+        object.__setattr__(point, 'a', FIELD_A)
+        object.__setattr__(point, 'b', FIELD_B)
+        object.__setattr__(point, 'x', S256Field._unchecked(x))
+        object.__setattr__(point, 'y', S256Field._unchecked(y))
+        return point
+
+    def __add__(self, other):
+        if not isinstance(other, S256Point):
+            return super().__add__(other)
+        return from_jacobian(jacobian_add(to_jacobian(self), to_jacobian(other)))
+
     def __rmul__(self, coefficient):
         coef = coefficient % N
-        return super().__rmul__(coef)
+        if self == G:
+            return from_jacobian(generator_multiply(coef))
+        return from_jacobian(jacobian_multiply_wnaf(to_jacobian(self), coef))
 
     def verify(self, z, sig):
-        s_inv = pow(sig.s, N-2, N)
+        s_inv = invert(sig.s, N)
         u = z * s_inv % N
         v = sig.r * s_inv % N
-        total = u*G + v*self
-        return total.x.num == sig.r
+        table = KEY_TABLES.lookup(self)
+        if table is not None:
+            # frequently verified key: both halves come from fixed-base tables
+            total = from_jacobian(jacobian_add(
+                generator_multiply(u), fixed_base_multiply(table, v)))
+        else:
+            # u*G + v*self on one doubling chain, converted back to affine once
+            total = from_jacobian(
+                jacobian_double_multiply(u, to_jacobian(G), v, to_jacobian(self)))
+        return total.x is not None and total.x.num == sig.r
+
+    @classmethod
+    def recover(cls, z, sig):
+        """
+        Returns {recovery_id: point} for every public key that sig is a valid
+        signature of z for, where the recovery id is the parity of R.y.
+        verify compares R.x with r directly, so the ids 2 and 3 of R.x = r + N
+        are left out.
+        """
+        if not (0 < sig.r < N and 0 < sig.s < N):
+            return {}
+        r_point = lift_x(sig.r)
+        if r_point is None:
+            return {}
+        r_inv = invert(sig.r, N)
+        # Q = r^-1 * (s*R - z*G); -R gives u*G - v*R, so both parities
+        # share the two scalar multiplications
+        u = -z * r_inv % N
+        v = sig.s * r_inv % N
+        u_g = generator_multiply(u)
+        v_r = jacobian_multiply_wnaf(r_point, v)
+        even, odd = from_jacobian_many([jacobian_add(u_g, v_r),
+                                       jacobian_add(u_g, jacobian_negate(v_r))])
+        return {recovery_id: point for recovery_id, point in ((0, even), (1, odd))
+                if point.x is not None}
 
     def sec(self, compressed=True):
         """Returns the binary version of the sec format"""
@@ -299,14 +1097,24 @@ class S256Point(Point):
     @classmethod
     def parse(self, sec_bin):
         """Returns a Point object from a SEC binary (not hex)"""
-        if sec_bin[4] == 4:
+        sec_bin = bytes(sec_bin)
+        point = SEC_CACHE.get(sec_bin)
+        if point is None:
+            point = self.parse_uncached(sec_bin)
+            SEC_CACHE.put(sec_bin, point)
+        return point
+
+    @classmethod
+    def parse_uncached(self, sec_bin):
+        """Parses a SEC binary without going through SEC_CACHE"""
+        if sec_bin[0] == 4:
             x = int.from_bytes(sec_bin[1:33], 'big')
             y = int.from_bytes(sec_bin[33:65], 'big')
             return S256Point(x=x, y=y)
         is_even = sec_bin[0] == 2
         x = S256Field(int.from_bytes(sec_bin[1:], 'big'))
         # right side of the equation y^2 = x^3 + 7
-        alpha = x**3 + S256Field(B)
+        alpha = x**3 + FIELD_B
         # solve for left side
         beta = alpha.sqrt()
         if beta.num % 2 == 0:
@@ -329,11 +1137,269 @@ class S256Point(Point):
         prefix = b'\x6f' if testnet else b'\x00'
         return encode_base58_checksum(prefix + h160)
 
+    def p2wpkh_address(self, testnet=False):
+        """Returns the native segwit (Bech32) address of the compressed key"""
+        return h160_to_p2wpkh_address(self.hash160(), testnet)
+
 G = S256Point(
      0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798,
      0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8)
 
 
+class S256Test(TestCase):
+
+    def setUp(self):
+        self.point = 0xabcdef * G
+
+    def test_order(self):
+        point = N * G
+        self.assertIsNone(point.x)
+
+    def test_pubpoint(self):
+        points = (
+            (7, 0x5cbdf0646e5db4eaa398f365f2ea7a0e3d419b7e0330e39ce92bddedcac4f9bc,
+             0x6aebca40ba255960a3178d6d861a54dba813d0b813fde7b5a5082628087264da),
+            (1485, 0xc982196a7466fbbbb0e27a940b6af926c1a74d5ad07128c82824a11b5398afda,
+             0x7a91f9eae64438afb9ce6448a1c133db2d8fb9254e4546b6f001637d50901f55),
+            (2**128, 0x8f68b9d2f63b5f339239c1ad981f162ee88c5678723ea3351b7b444c9ec4c0da,
+             0x662a9f2dba063986de1d90c2b6be215dbbea2cfe95510bfdf23cbf79501fff82),
+        )
+        for secret, x, y in points:
+            self.assertEqual(secret * G, S256Point(x, y))
+
+    def affine_multiply(self, point, coefficient):
+        # double-and-add through the affine Point.__add__, bypassing the
+        # Jacobian S256Point.__add__
+        result = S256Point(None, None)
+        current = point
+        while coefficient:
+            if coefficient & 1:
+                result = Point.__add__(result, current)
+            current = Point.__add__(current, current)
+            coefficient >>= 1
+        return result
+
+    def test_jacobian_matches_affine(self):
+        for secret in (1, 2, 3, 0xdeadbeef12345, N - 1, randint(1, N - 1)):
+            self.assertEqual(secret * G, self.affine_multiply(G, secret))
+            self.assertEqual(secret * self.point, self.affine_multiply(self.point, secret))
+        self.assertEqual(self.point + G, Point.__add__(self.point, G))
+
+    def test_batch_inverse(self):
+        elements = [S256Field(n) for n in (1, 2, 0, P - 1, 0xabcdef)]
+        expected = [S256Field(1) / element for element in elements]
+        self.assertEqual(batch_inverse(elements), expected)
+        self.assertEqual(batch_inverse([FieldElement(n, 31) for n in (3, 0, 7)]),
+                         [FieldElement(21, 31), FieldElement(0, 31), FieldElement(9, 31)])
+        self.assertEqual(batch_inverse([]), [])
+        points = [jacobian_multiply(to_jacobian(G), k) for k in (0, 1, 5, 2**200)]
+        self.assertEqual(from_jacobian_many(points),
+                         [from_jacobian(point) for point in points])
+
+    def test_backend(self):
+        self.assertEqual(_python_invert(0xabcdef, P) * 0xabcdef % P, 1)
+        self.assertEqual(_python_invert(0, P), 0)
+        with self.assertRaises(ValueError):
+            set_backend('fortran')
+        try:
+            import gmpy2
+        except ImportError:
+            self.skipTest('gmpy2 is not installed')
+        backend = BACKEND
+        secret = randint(1, N - 1)
+        expected = secret * self.point
+        private_key = PrivateKey(secret)
+        sig = private_key.sign(0xabc)
+        try:
+            set_backend('gmpy2')
+            self.assertEqual(secret * self.point, expected)
+            self.assertEqual(type((secret * self.point).x.num), int)
+            self.assertEqual(private_key.sign(0xabc).der(), sig.der())
+            self.assertEqual(private_key.sign_many([0xabc])[0].der(), sig.der())
+            self.assertTrue(private_key.point.verify(0xabc, sig))
+            self.assertEqual(S256Point.parse_uncached(self.point.sec()), self.point)
+        finally:
+            set_backend(backend)
+
+    def test_hashable(self):
+        same = S256Point(self.point.x.num, self.point.y.num)
+        self.assertEqual(hash(self.point), hash(same))
+        self.assertEqual({self.point: 'key'}[same], 'key')
+        self.assertEqual(hash(S256Field(5)), hash(FieldElement(5, P)))
+        self.assertFalse(hasattr(self.point, '__dict__'))
+        self.assertFalse(hasattr(self.point.x, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.point.y = self.point.x
+        self.assertEqual(pickle.loads(pickle.dumps(self.point)), self.point)
+        self.assertEqual(type(pickle.loads(pickle.dumps(self.point.x))), S256Field)
+
+    def test_unchecked(self):
+        x, y = self.point.x, self.point.y
+        self.assertEqual(S256Point._unchecked(x.num, y.num), self.point)
+        self.assertEqual(type(x), S256Field)
+        self.assertEqual(self.point + G, Point.__add__(self.point, G))
+        self.assertEqual(self.point + self.point, Point.__add__(self.point, self.point))
+        self.assertIsNone((self.point + S256Point(x, S256Field(0) - y)).x)
+        self.assertEqual(self.point + S256Point(None, None), self.point)
+        with self.assertRaises(ValueError):
+            S256Point(x.num, y.num + 1)
+        x = S256Field(0xabcdef)
+        self.assertEqual(x * x - x / (x + x), FieldElement(
+            (0xabcdef**2 - 0xabcdef * pow(2 * 0xabcdef, P - 2, P)) % P, P))
+        with self.assertRaises(ValueError):
+            S256Field(P)
+        with self.assertRaises(ValueError):
+            # x = 5 has no y on the curve
+            S256Point.parse(b'\x02' + (5).to_bytes(32, 'big'))
+
+    def test_parse_cache(self):
+        SEC_CACHE.clear()
+        for compressed in (True, False):
+            sec = self.point.sec(compressed)
+            self.assertEqual(S256Point.parse(sec), self.point)
+            self.assertEqual(S256Point.parse(bytearray(sec)), self.point)
+        self.assertEqual(SEC_CACHE.stats()['hits'], 2)
+        self.assertEqual(SEC_CACHE.stats()['misses'], 2)
+        cache = LRUCache(capacity=2)
+        cache.put(b'a', 1)
+        cache.put(b'b', 2)
+        cache.get(b'a')
+        cache.put(b'c', 3)
+        self.assertIsNone(cache.get(b'b'))
+        self.assertEqual(cache.get(b'a'), 1)
+        cache.resize(1)
+        self.assertEqual(list(cache.entries), [b'a'])
+        cache.resize(0)
+        cache.put(b'd', 4)
+        self.assertEqual(len(cache), 0)
+
+    def test_key_tables(self):
+        cache = KeyTableCache(threshold=2, window=3)
+        points = [k * G for k in (0xabc, 0xdef)]
+        self.assertIsNone(cache.lookup(points[0]))
+        table = cache.lookup(points[0])
+        secret = randint(1, N - 1)
+        self.assertEqual(from_jacobian(fixed_base_multiply(table, secret)),
+                         secret * points[0])
+        self.assertIs(cache.lookup(points[0]), table)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['builds'], 1)
+        # room for exactly one table: the second key evicts the first
+        cache.memory_budget = cache.memory
+        cache.lookup(points[1])
+        cache.lookup(points[1])
+        self.assertEqual(list(cache.tables), [points[1]])
+        self.assertEqual(cache.stats()['evictions'], 1)
+        cache.memory_budget = 0
+        self.assertIsNone(cache.lookup(points[1]))
+
+    def test_generator_table(self):
+        for secret in (0, 1, 15, 16, 2**255 + 17, N - 1, N, randint(1, N - 1)):
+            self.assertEqual(from_jacobian(generator_multiply(secret)),
+                             from_jacobian(jacobian_multiply(to_jacobian(G), secret % N)))
+
+    def test_wnaf(self):
+        for secret in (1, 0b10111, 2**256 - 1, randint(1, N - 1)):
+            for width in (2, 4, 5, 7):
+                digits = wnaf(secret, width)
+                self.assertEqual(sum(d << i for i, d in enumerate(digits)), secret)
+                for i, digit in enumerate(digits):
+                    if digit:
+                        self.assertTrue(digit & 1)
+                        self.assertLess(abs(digit), 1 << (width - 1))
+                        self.assertFalse(any(digits[i + 1:i + width]))
+        secret = randint(1, N - 1)
+        expected = from_jacobian(jacobian_multiply(to_jacobian(self.point), secret))
+        for width in (2, 3, 4, 5, 6, 8):
+            self.assertEqual(from_jacobian(
+                jacobian_multiply_wnaf(to_jacobian(self.point), secret, width)), expected)
+        with self.assertRaises(ValueError):
+            wnaf(secret, 1)
+
+    def test_double_multiply(self):
+        for _ in range(3):
+            a, b = randint(0, N - 1), randint(0, N - 1)
+            expected = a * G + b * self.point
+            self.assertEqual(from_jacobian(jacobian_double_multiply(
+                a, to_jacobian(G), b, to_jacobian(self.point))), expected)
+            self.assertEqual(from_jacobian(jacobian_double_multiply(
+                a, to_jacobian(self.point), b, to_jacobian(self.point), width=3)),
+                (a + b) * self.point)
+        self.assertIsNone(from_jacobian(jacobian_double_multiply(
+            1, to_jacobian(G), N - 1, to_jacobian(G))).x)
+
+    def test_glv(self):
+        self.assertEqual(LAMBDA * G, from_jacobian(jacobian_endomorphism(to_jacobian(G))))
+        secrets = [1, N - 1, 2**128 + 3, randint(1, N - 1), randint(1, N - 1)]
+        for secret in secrets:
+            k1, k2 = glv_split(secret)
+            self.assertEqual((k1 + k2 * LAMBDA) % N, secret)
+            self.assertLess(abs(k1).bit_length(), 130)
+            self.assertLess(abs(k2).bit_length(), 130)
+        enabled = USE_GLV
+        try:
+            set_glv(False)
+            plain = [(secret * self.point, from_jacobian(jacobian_double_multiply(
+                secret, to_jacobian(G), secret // 3, to_jacobian(self.point))))
+                for secret in secrets]
+            set_glv(True)
+            for secret, expected in zip(secrets, plain):
+                self.assertEqual(secret * self.point, expected[0])
+                self.assertEqual(from_jacobian(jacobian_double_multiply(
+                    secret, to_jacobian(G), secret // 3, to_jacobian(self.point))),
+                    expected[1])
+        finally:
+            set_glv(enabled)
+
+    def test_verify(self):
+        point = S256Point(
+            0x887387e452b8eacc4acfde10d9aaf7f6d9a0f975aabb10d006e4da568744d06c,
+            0x61de6d95231cd89026e286df3b6ae4a894a3378e393e93a0f45b666329a0ae34)
+        z = 0xec208baa0fc1c19f708a9ca96fdeff3ac3f230bb4a7ba4aede4942ad003c0f60
+        r = 0xac8d1c87e51d0d441be8b3dd5b05c8795b48875dffe00b7ffcfac23010d3a395
+        s = 0x68342ceff8935ededd102dd876ffd6ba72d6a427a3edb13d26eb0781cb423c4
+        self.assertTrue(point.verify(z, Signature(r, s)))
+        z = 0x7c076ff316692a3d7eb3c3bb0f8b1488cf72e1afcd929e29307032997a838a3d
+        r = 0xeff69ef2b1bd93a66ed5219add4fb51e11a840f404876325a1e8ffe0529a2c
+        s = 0xc7207fee197d27c618aea621406f6bf5ef6fca38681d82b2f06fddbdce6feab6
+        self.assertTrue(point.verify(z, Signature(r, s)))
+        self.assertFalse(point.verify(z + 1, Signature(r, s)))
+        # the same checks once the key has a precomputed table
+        KEY_TABLES.clear()
+        threshold = KEY_TABLES.threshold
+        KEY_TABLES.threshold = 1
+        try:
+            self.assertTrue(point.verify(z, Signature(r, s)))
+            self.assertFalse(point.verify(z + 1, Signature(r, s)))
+            self.assertEqual(KEY_TABLES.stats()['hits'], 1)
+        finally:
+            KEY_TABLES.threshold = threshold
+            KEY_TABLES.clear()
+
+    def test_p2wpkh_address(self):
+        # BIP173 example key
+        point = S256Point.parse(bytes.fromhex(
+            '0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798'))
+        self.assertEqual(point.p2wpkh_address(),
+                         'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4')
+        self.assertEqual(G.p2wpkh_address(testnet=True),
+                         'tb1qw508d6qejxtdg4y5r3zarvary0c5xw7kxpjzsx')
+
+    def test_recover(self):
+        for secret in (1, 0xcafe, randint(1, N - 1)):
+            private_key = PrivateKey(secret)
+            z = randint(0, 2**256)
+            sig = private_key.sign(z)
+            candidates = S256Point.recover(z, sig)
+            self.assertLessEqual(set(candidates), {0, 1})
+            self.assertIn(private_key.point, candidates.values())
+            for point in candidates.values():
+                self.assertTrue(point.verify(z, sig))
+            self.assertNotIn(private_key.point,
+                             S256Point.recover(z + 1, sig).values())
+        self.assertEqual(S256Point.recover(z, Signature(0, sig.s)), {})
+
+
 class Signature:
     def __init__(self, r, s):
         self.r = r
@@ -392,16 +1458,188 @@ class PrivateKey:
         return '{:x}'.format(self.secret).zfill(64)
 
     def sign(self, z):
-        k = randint(O, N)
+        k = self.deterministic_k(z)
         r = (k * G).x.num
-        k_inv = pow(k, N-2, N)
+        k_inv = invert(k, N)
         s = (z + r * self.secret) * k_inv % N
-        if s > N/2:
+        if s > N // 2:
             s = N - s
         return Signature(r, s)
 
+    def sign_many(self, zs):
+        """
+        Signs every z in zs, same as [self.sign(z) for z in zs]. The shared
+        inversions save about 10-40% over that loop.
+        """
+        return PrivateKey.sign_batch([(self, z) for z in zs])
+
+    @staticmethod
+    def sign_batch(items):
+        """
+        Signs a list of (PrivateKey, z) pairs. All the k*G points are
+        normalized with one inversion mod P and all the k inverses share one
+        inversion mod N, so the signatures match single-shot sign.
+        """
+        ks = [private_key.deterministic_k(z) for private_key, z in items]
+        r_points = jacobian_normalize_many([generator_multiply(k) for k in ks])
+        k_invs = invert_many(ks, N)
+        signatures = []
+        for (private_key, z), (r, _, _), k_inv in zip(items, r_points, k_invs):
+            r = int(r)
+            s = (z + r * private_key.secret) * k_inv % N
+            if s > N // 2:
+                s = N - s
+            signatures.append(Signature(r, s))
+        return signatures
+
+    def deterministic_k(self, z):
+        """RFC 6979 nonce for signing z with this key"""
+        k = b'\x00' * 32
+        v = b'\x01' * 32
+        if z > N:
+            z -= N
+        z_bytes = z.to_bytes(32, 'big')
+        secret_bytes = self.secret.to_bytes(32, 'big')
+        s256 = hashlib.sha256
+        k = hmac.new(k, v + b'\x00' + secret_bytes + z_bytes, s256).digest()
+        v = hmac.new(k, v, s256).digest()
+        k = hmac.new(k, v + b'\x01' + secret_bytes + z_bytes, s256).digest()
+        v = hmac.new(k, v, s256).digest()
+        while True:
+            v = hmac.new(k, v, s256).digest()
+            candidate = int.from_bytes(v, 'big')
+            if candidate >= 1 and candidate < N:
+                return candidate
+            k = hmac.new(k, v + b'\x00', s256).digest()
+            v = hmac.new(k, v, s256).digest()
+
     def wif(self, compressed=True, testnet=False):
         secret_bytes = self.secret.to_bytes(32, 'big')
         prefix = b'\xef' if testnet else b'\x80'
         suffix = b'\x01' if compressed else b''
         return encode_base58_checksum(prefix + secret_bytes + suffix)
+
+
+# Batch verification checks sum(a_i * (u_i*G + v_i*Q_i)) == sum(+-a_i * R_i)
+# for random a_i, where R_i is recovered from r_i. ECDSA does not fix the sign
+# of R_i, so each group of BATCH_SIZE signatures tries every sign pattern in
+# Gray code order, one point addition per pattern. A group that matches no
+# pattern is re-checked one signature at a time. A bad group passes with
+# probability about 2^BATCH_SIZE / 2^BATCH_RANDOM_BITS. The sign search keeps
+# groups far below PIPPENGER_THRESHOLD, so their v*Q sums go straight to
+# Strauss.
+BATCH_SIZE = 8
+BATCH_RANDOM_BITS = 64
+_batch_random = SystemRandom()
+
+def _batch_group(items):
+    """Returns True if every (point, z, sig) in items is valid"""
+    u_sum = 0
+    pairs = []
+    r_points = []
+    for point, z, sig in items:
+        if not (0 < sig.r < N and 0 < sig.s < N) or sig.r + N < P:
+            # out of range, or r could be the x of two different R
+            return False
+        r_point = lift_x(sig.r)
+        if r_point is None:
+            return False
+        a = _batch_random.randrange(1, 1 << BATCH_RANDOM_BITS)
+        s_inv = invert(sig.s, N)
+        u_sum += a * z * s_inv
+        pairs.append((a * sig.r * s_inv, to_jacobian(point)))
+        r_points.append(jacobian_multiply_wnaf(r_point, a))
+    left = jacobian_add(generator_multiply(u_sum), strauss_multi_multiply(pairs))
+    right = JACOBIAN_INFINITY
+    for r_point in r_points:
+        right = jacobian_add(right, r_point)
+    if jacobian_equal(left, right):
+        return True
+    # flipping the sign of a_i * R_i moves the sum by 2 * a_i * R_i
+    steps = [jacobian_double(r_point) for r_point in r_points]
+    signs = [1] * len(r_points)
+    for count in range(1, 1 << len(r_points)):
+        i = (count & -count).bit_length() - 1
+        if signs[i] > 0:
+            right = jacobian_add(right, jacobian_negate(steps[i]))
+        else:
+            right = jacobian_add(right, steps[i])
+        signs[i] = -signs[i]
+        if jacobian_equal(left, right):
+            return True
+    return False
+
+def batch_verify(items):
+    """
+    Verifies a list of (S256Point, z, Signature) triples together. Returns
+    the indices of the invalid ones, so an empty list means all are valid.
+    """
+    failed = []
+    for start in range(0, len(items), BATCH_SIZE):
+        group = items[start:start + BATCH_SIZE]
+        if _batch_group(group):
+            continue
+        for i, (point, z, sig) in enumerate(group):
+            if not point.verify(z, sig):
+                failed.append(start + i)
+    return failed
+
+
+class PrivateKeyTest(TestCase):
+
+    def test_sign(self):
+        private_key = PrivateKey(randint(1, N - 1))
+        z = randint(0, 2**256)
+        sig = private_key.sign(z)
+        self.assertTrue(private_key.point.verify(z, sig))
+        self.assertEqual(private_key.sign(z).der(), sig.der())
+        self.assertLessEqual(sig.s, N // 2)
+
+    def test_sign_many(self):
+        private_key = PrivateKey(0xcafe)
+        zs = [randint(0, 2**256) for _ in range(5)]
+        self.assertEqual([sig.der() for sig in private_key.sign_many(zs)],
+                         [private_key.sign(z).der() for z in zs])
+        keys = [PrivateKey(secret) for secret in (1, 2, 0xcafe)]
+        items = [(key, z) for key in keys for z in zs[:2]]
+        sigs = PrivateKey.sign_batch(items)
+        for (key, z), sig in zip(items, sigs):
+            self.assertEqual(sig.der(), key.sign(z).der())
+            self.assertTrue(key.point.verify(z, sig))
+        self.assertEqual(PrivateKey.sign_batch([]), [])
+
+
+class BatchVerifyTest(TestCase):
+
+    def test_multi_multiply(self):
+        points = [(3**i + 11) * G for i in range(20)]
+        pairs = [(randint(0, N - 1), point) for point in points]
+        expected = S256Point(None, None)
+        for coef, point in pairs:
+            expected += coef * point
+        self.assertEqual(multi_multiply(pairs), expected)
+        jacobian_pairs = [(coef, to_jacobian(point)) for coef, point in pairs]
+        self.assertEqual(from_jacobian(strauss_multi_multiply(jacobian_pairs)), expected)
+        for window in (1, 3, 6):
+            self.assertEqual(from_jacobian(
+                pippenger_multiply(jacobian_pairs, window)), expected)
+        self.assertIsNone(multi_multiply([]).x)
+        self.assertIsNone(multi_multiply([(1, G), (N - 1, G)]).x)
+        for coef in (1, 2**255 - 19, N - 1):
+            for window in (1, 2, 5, 8):
+                digits = signed_digits(coef, window)
+                self.assertEqual(sum(d << (window * i) for i, d in enumerate(digits)), coef)
+
+    def test_batch_verify(self):
+        items = []
+        for secret in range(1, 12):
+            private_key = PrivateKey(secret * 0x1337 + 5)
+            z = randint(0, 2**256)
+            items.append((private_key.point, z, private_key.sign(z)))
+        self.assertEqual(batch_verify(items), [])
+        point, z, sig = items[3]
+        items[3] = (point, z + 1, sig)
+        point, z, sig = items[9]
+        items[9] = (point, z, Signature(sig.r, N - sig.s + 1))
+        self.assertEqual(batch_verify(items), [3, 9])
+        self.assertEqual(batch_verify([]), [])
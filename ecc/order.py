@@ -0,0 +1,233 @@
+"""
+Point and group orders for small curves y^2 = x^3 + ax + b over F_p, built
+on the Point and FieldElement classes from ecc.py.
+
+Counting how many times a point has to be added to itself before reaching
+infinity is O(p). Here the order comes from baby-step giant-step over the
+Hasse interval [p + 1 - 2*sqrt(p), p + 1 + 2*sqrt(p)], which is O(p^(1/4))
+point additions with a dict of baby steps keyed by the (hashable) points.
+The curve order combines the orders of random points on the curve and on
+its quadratic twist until only one candidate in the Hasse interval is left
+(Mestre's method).
+"""
+from math import isqrt, lcm
+from random import Random
+from unittest import TestCase
+
+from ecc.ecc import FieldElement, Point
+
+
+def hasse_interval(prime):
+    """Returns the inclusive (low, high) bounds on the curve order"""
+    width = 2 * isqrt(prime) + 1
+    return max(prime + 1 - width, 1), prime + 1 + width
+
+
+def legendre(n, prime):
+    """Returns 1 if n is a nonzero square mod prime, -1 if not, 0 if n is 0"""
+    n %= prime
+    if n == 0:
+        return 0
+    return 1 if pow(n, (prime - 1) // 2, prime) == 1 else -1
+
+
+def sqrt_mod(n, prime):
+    """Returns a square root of n mod prime (Tonelli-Shanks), or None"""
+    n %= prime
+    if n == 0 or prime == 2:
+        return n
+    if legendre(n, prime) != 1:
+        return None
+    if prime % 4 == 3:
+        return pow(n, (prime + 1) // 4, prime)
+    # prime - 1 = q * 2^s with q odd
+    q, s = prime - 1, 0
+    while q % 2 == 0:
+        q //= 2
+        s += 1
+    z = 2
+    while legendre(z, prime) != -1:
+        z += 1
+    m, c, t, r = s, pow(z, q, prime), pow(n, q, prime), pow(n, (q + 1) // 2, prime)
+    while t != 1:
+        i, t2 = 0, t
+        while t2 != 1:
+            t2 = t2 * t2 % prime
+            i += 1
+        b = pow(c, 1 << (m - i - 1), prime)
+        m, c, t, r = i, b * b % prime, t * b * b % prime, r * b % prime
+    return r
+
+
+def prime_factors(n):
+    """Returns the distinct prime factors of n by trial division"""
+    factors = []
+    d = 2
+    while d * d <= n:
+        if n % d == 0:
+            factors.append(d)
+            while n % d == 0:
+                n //= d
+        d += 1 if d == 2 else 2
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+def _multiple_in_interval(point, low, high):
+    """
+    Baby-step giant-step: returns some m in [low, high] with m*point at
+    infinity, or None if there is none.
+    """
+    infinity = point.__class__(None, None, point.a, point.b)
+    steps = isqrt(high - low) + 1
+    # baby steps: -j*point for j in [0, steps)
+    baby = {}
+    current = infinity
+    negated = infinity
+    for j in range(steps):
+        baby.setdefault(negated, j)
+        current = current + point
+        negated = _negate(current)
+    # giant steps: (low + g*steps) * point
+    giant = steps * point
+    current = low * point
+    start = low
+    while start <= high:
+        j = baby.get(current)
+        if j is not None and start + j <= high and start + j > 0:
+            return start + j
+        current = current + giant
+        start += steps
+    return None
+
+
+def _negate(point):
+    if point.x is None:
+        return point
+    return point.__class__(point.x, FieldElement(0, point.y.prime) - point.y,
+                           point.a, point.b)
+
+
+def reduce_order(point, multiple):
+    """Given multiple*point at infinity, returns the exact order of point"""
+    order = multiple
+    for factor in prime_factors(multiple):
+        while order % factor == 0 and (order // factor * point).x is None:
+            order //= factor
+    return order
+
+
+def point_order(point):
+    """Returns the order of a point on a curve over a small prime field"""
+    if point.x is None:
+        return 1
+    prime = point.x.prime
+    low, high = hasse_interval(prime)
+    multiple = _multiple_in_interval(point, low, high)
+    if multiple is None:
+        raise ValueError('{} has no multiple at infinity in the Hasse interval; '
+                         'is the curve nonsingular?'.format(point))
+    return reduce_order(point, multiple)
+
+
+def random_point(a, b, prime, rng):
+    """Returns a random affine Point on y^2 = x^3 + ax + b over F_prime"""
+    while True:
+        x = rng.randrange(prime)
+        y = sqrt_mod(x**3 + a * x + b, prime)
+        if y is None:
+            continue
+        if rng.randrange(2):
+            y = (prime - y) % prime
+        return Point(FieldElement(x, prime), FieldElement(y, prime),
+                     FieldElement(a % prime, prime), FieldElement(b % prime, prime))
+
+
+def count_points(a, b, prime):
+    """Counts the points (infinity included) by Legendre symbols, O(p)"""
+    total = 1
+    for x in range(prime):
+        total += 1 + legendre(x**3 + a * x + b, prime)
+    return total
+
+
+def curve_order(a, b, prime, tries=20, seed=None):
+    """
+    Returns the number of points on y^2 = x^3 + ax + b over F_prime,
+    including infinity. Random points on the curve and on its quadratic twist
+    narrow the Hasse interval down to one value. Tiny primes, where that can
+    stay ambiguous, fall back to counting.
+    """
+    if (4 * a**3 + 27 * b**2) % prime == 0:
+        raise ValueError('y^2 = x^3 + {}x + {} is singular mod {}'.format(a, b, prime))
+    if prime < 230:
+        return count_points(a, b, prime)
+    rng = Random(seed)
+    # the twist y^2 = x^3 + a*d^2*x + b*d^3 has 2p + 2 - #E points
+    d = 2
+    while legendre(d, prime) != -1:
+        d += 1
+    twist_a, twist_b = a * d * d % prime, b * d**3 % prime
+    curve_lcm, twist_lcm = 1, 1
+    for _ in range(tries):
+        curve_lcm = lcm(curve_lcm, point_order(random_point(a, b, prime, rng)))
+        twist_lcm = lcm(twist_lcm, point_order(random_point(twist_a, twist_b, prime, rng)))
+        candidates = _order_candidates(prime, curve_lcm, twist_lcm)
+        if candidates is not None and len(candidates) == 1:
+            return candidates[0]
+    raise RuntimeError('curve order still ambiguous after {} tries'.format(tries))
+
+
+def _order_candidates(prime, curve_lcm, twist_lcm):
+    """
+    Returns the n in the Hasse interval with curve_lcm | n and
+    twist_lcm | 2p + 2 - n, or None while that list would be too long
+    """
+    low, high = hasse_interval(prime)
+    total = 2 * prime + 2
+    if max(curve_lcm, twist_lcm) * 1000 < high - low:
+        return None
+    if curve_lcm >= twist_lcm:
+        start = -(-low // curve_lcm) * curve_lcm
+        return [n for n in range(start, high + 1, curve_lcm)
+                if (total - n) % twist_lcm == 0]
+    start = -(-(total - high) // twist_lcm) * twist_lcm
+    return [total - t for t in range(start, total - low + 1, twist_lcm)
+            if (total - t) % curve_lcm == 0]
+
+
+class OrderTest(TestCase):
+
+    def test_sqrt_mod(self):
+        for prime in (223, 10009, 65537):
+            for n in range(1, 200):
+                root = sqrt_mod(n, prime)
+                if legendre(n, prime) == 1:
+                    self.assertEqual(root * root % prime, n)
+                else:
+                    self.assertIsNone(root)
+
+    def test_point_order(self):
+        prime = 223
+        a = FieldElement(0, prime)
+        b = FieldElement(7, prime)
+        point = Point(FieldElement(15, prime), FieldElement(86, prime), a, b)
+        self.assertEqual(point_order(point), 7)
+        rng = Random(3)
+        for _ in range(20):
+            point = random_point(0, 7, prime, rng)
+            order = point_order(point)
+            self.assertIsNone((order * point).x)
+            for factor in prime_factors(order):
+                self.assertIsNotNone((order // factor * point).x)
+        self.assertEqual(point_order(Point(None, None, a, b)), 1)
+
+    def test_curve_order(self):
+        self.assertEqual(curve_order(0, 7, 223), count_points(0, 7, 223))
+        for a, b, prime in ((0, 7, 1009), (2, 3, 10007), (5, 11, 65537),
+                            (1, 1, 100003)):
+            self.assertEqual(curve_order(a, b, prime, seed=1),
+                             count_points(a, b, prime))
+        with self.assertRaises(ValueError):
+            curve_order(0, 0, 1009)
@@ -0,0 +1,213 @@
+"""
+Pollard's rho for the discrete log on small curves: given points P and
+Q = kP on y^2 = x^3 + ax + b over F_p, find k. This is the attack that sets
+the security level of an elliptic curve, and on toy curves with 20 to 40 bit
+group orders it finishes in seconds where brute force takes hours.
+
+The walk is an r-adding walk, X -> X + M[x mod r] with M[j] = a_j*P + b_j*Q,
+so every point visited is a known combination aP + bQ. Following van
+Oorschot and Wiener, walks only report distinguished points (those whose x
+has its low bits all zero) to a collision table kept by the parent process.
+Two walks that meet follow the same path from then on and report the same
+distinguished point with different (a, b), which gives
+k = (a1 - a2) / (b2 - b1) mod n. Workers never talk to each other, so the
+iteration rate grows with the number of cores.
+
+The walks use plain integer affine arithmetic rather than FieldElement and
+Point objects, which would spend most of their time allocating.
+"""
+from itertools import count
+import os
+import time
+from multiprocessing import Pool
+from random import Random
+from unittest import TestCase
+
+from ecc.ecc import FieldElement, Point
+from ecc.order import point_order, random_point
+from helper import queued_results
+
+PARTITIONS = 20
+
+
+def _affine_add(p1, p2, a, prime):
+    """Adds two (x, y) tuples on the curve; None is the point at infinity"""
+    if p1 is None:
+        return p2
+    if p2 is None:
+        return p1
+    x1, y1 = p1
+    x2, y2 = p2
+    if x1 == x2:
+        if (y1 + y2) % prime == 0:
+            return None
+        slope = (3 * x1 * x1 + a) * pow(2 * y1, -1, prime) % prime
+    else:
+        slope = (y2 - y1) * pow(x2 - x1, -1, prime) % prime
+    x3 = (slope * slope - x1 - x2) % prime
+    return x3, (slope * (x1 - x3) - y1) % prime
+
+
+def _affine_multiply(coefficient, point, a, prime):
+    result = None
+    current = point
+    while coefficient:
+        if coefficient & 1:
+            result = _affine_add(result, current, a, prime)
+        current = _affine_add(current, current, a, prime)
+        coefficient >>= 1
+    return result
+
+
+def _combine(coef_p, p, coef_q, q, a, prime):
+    return _affine_add(_affine_multiply(coef_p, p, a, prime),
+                       _affine_multiply(coef_q, q, a, prime), a, prime)
+
+
+def distinguishing_bits(order):
+    """
+    Default number of zero low bits that make a point distinguished. The
+    rho needs about sqrt(n) steps, so this aims for a few dozen distinguished
+    points per solve whatever the size of the group.
+    """
+    return max(0, order.bit_length() // 2 - 6)
+
+
+def _rho_walks(job, seed):
+    """
+    Runs walks from random starting points until at least job['steps']
+    iterations are done, finishing the walk in progress. Returns the list of
+    distinguished (x, y, a, b), the iteration count and the seconds spent.
+    """
+    start_time = time.perf_counter()
+    a, prime, order = job['a'], job['prime'], job['order']
+    p, q = job['p'], job['q']
+    mask = (1 << job['bits']) - 1
+    # a walk that never hits a distinguished point is stuck in a cycle
+    max_length = 20 << job['bits']
+    jumps = job['jumps']
+    rng = Random(seed)
+    found = []
+    iterations = 0
+    while iterations < job['steps']:
+        coef_p, coef_q = rng.randrange(order), rng.randrange(order)
+        point = _combine(coef_p, p, coef_q, q, a, prime)
+        for _ in range(max_length):
+            if point is None:
+                break
+            x, y = point
+            if x & mask == 0:
+                found.append((x, y, coef_p, coef_q))
+                break
+            jump_x, jump_y, jump_p, jump_q = jumps[x % PARTITIONS]
+            iterations += 1
+            if x == jump_x:
+                point = _affine_add(point, (jump_x, jump_y), a, prime)
+            else:
+                slope = (jump_y - y) * pow(jump_x - x, -1, prime) % prime
+                x3 = (slope * slope - x - jump_x) % prime
+                point = x3, (slope * (x - x3) - y) % prime
+            coef_p = (coef_p + jump_p) % order
+            coef_q = (coef_q + jump_q) % order
+    return found, iterations, time.perf_counter() - start_time
+
+
+def pollard_rho(point, target, order=None, workers=None, bits=None, seed=None):
+    """
+    Returns (k, stats) with k*point == target. order is the order of point,
+    which has to be prime (computed with point_order if not given). The
+    walks run in a pool of workers processes, os.cpu_count() by default,
+    or in this process when workers is 1. stats has the total iterations,
+    the wall-clock seconds, the number of distinguished points and the
+    iterations per second per core.
+    """
+    if point.x is None:
+        raise ValueError('cannot take a discrete log to the base infinity')
+    if order is None:
+        order = point_order(point)
+    if (order * target).x is not None:
+        raise ValueError('{} is not in the group generated by {}'.format(target, point))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if bits is None:
+        bits = distinguishing_bits(order)
+    prime = point.x.prime
+    a = point.a.num
+    p = (point.x.num, point.y.num)
+    q = None if target.x is None else (target.x.num, target.y.num)
+    rng = Random(seed)
+    jumps = []
+    while len(jumps) < PARTITIONS:
+        coef_p, coef_q = rng.randrange(1, order), rng.randrange(1, order)
+        jump = _combine(coef_p, p, coef_q, q, a, prime)
+        if jump is not None:
+            jumps.append((jump[0], jump[1], coef_p, coef_q))
+    job = {
+        'a': a, 'prime': prime, 'order': order, 'p': p, 'q': q,
+        'bits': bits, 'jumps': jumps,
+        'steps': max(1000, 32 << bits),
+    }
+    stats = {'iterations': 0, 'distinguished': 0, 'workers': workers,
+             'worker_seconds': 0.0}
+    table = {}
+    start_time = time.perf_counter()
+
+    def collide(found, iterations, seconds):
+        stats['iterations'] += iterations
+        stats['worker_seconds'] += seconds
+        stats['distinguished'] += len(found)
+        for x, y, coef_p, coef_q in found:
+            other = table.setdefault((x, y), (coef_p, coef_q))
+            if other[1] != coef_q:
+                return (other[0] - coef_p) * pow(coef_q - other[1], -1, order) % order
+        return None
+
+    answer = None
+    if workers == 1:
+        while answer is None:
+            answer = collide(*_rho_walks(job, rng.getrandbits(64)))
+    else:
+        jobs = ((None, (job, rng.getrandbits(64))) for _ in count())
+        with Pool(workers) as pool:
+            for _, result in queued_results(pool, _rho_walks, jobs, 2 * workers):
+                answer = collide(*result)
+                if answer is not None:
+                    break
+            pool.terminate()
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['rate_per_core'] = stats['iterations'] / max(stats['worker_seconds'], 1e-9)
+    return answer, stats
+
+
+class PollardRhoTest(TestCase):
+
+    def check(self, prime, order, workers):
+        rng = Random(prime)
+        point = random_point(0, 7, prime, rng)
+        secret = rng.randrange(1, order)
+        target = secret * point
+        k, stats = pollard_rho(point, target, order=order, workers=workers, seed=1)
+        self.assertEqual(k, secret)
+        self.assertGreater(stats['iterations'], 0)
+        self.assertGreater(stats['rate_per_core'], 0)
+
+    def test_small(self):
+        # y^2 = x^3 + 7 has a prime number of points over these fields
+        self.check(1048783, 1050337, 1)
+        self.check(4294968199, 4295016211, 1)
+
+    def test_pool(self):
+        self.check(1048783, 1050337, 2)
+
+    def test_affine(self):
+        prime = 223
+        a = FieldElement(0, prime)
+        b = FieldElement(7, prime)
+        point = Point(FieldElement(47, prime), FieldElement(71, prime), a, b)
+        for coefficient in range(1, 22):
+            expected = coefficient * point
+            result = _affine_multiply(coefficient, (47, 71), 0, prime)
+            if expected.x is None:
+                self.assertIsNone(result)
+            else:
+                self.assertEqual(result, (expected.x.num, expected.y.num))
@@ -0,0 +1,111 @@
+"""
+Addresses for a contiguous range of secrets. PrivateKey(secret).point
+costs a full scalar multiplication per key. Here the range is walked as
+P, P + G, P + 2G, ... with one mixed Jacobian addition per key, and every
+chunk of points is brought back to affine with a single shared inversion
+(jacobian_normalize_many) before hashing.
+
+find_prefixes splits a range into segments and searches them for addresses
+that start with a given prefix across a process pool.
+"""
+import os
+from multiprocessing import Pool
+from unittest import TestCase
+
+from ecc.ecc import (
+    G,
+    generator_multiply,
+    jacobian_add,
+    jacobian_normalize_many,
+    N,
+    PrivateKey,
+    to_jacobian,
+)
+from helper import encode_base58_checksum, hash160_many
+
+
+def _sec(x, y, compressed):
+    if compressed:
+        return (b'\x03' if y % 2 else b'\x02') + int(x).to_bytes(32, 'big')
+    return b'\x04' + int(x).to_bytes(32, 'big') + int(y).to_bytes(32, 'big')
+
+
+def address_range(start, count, compressed=True, testnet=False, chunk_size=1024):
+    """
+    Yields (secret, address) for the secrets start, start + 1, ...,
+    start + count - 1, one point addition per key.
+    """
+    if start < 1 or start + count > N:
+        raise ValueError('secrets have to be in [1, N)')
+    prefix = b'\x6f' if testnet else b'\x00'
+    g = to_jacobian(G)
+    point = generator_multiply(start)
+    secret = start
+    end = start + count
+    while secret < end:
+        size = min(chunk_size, end - secret)
+        chunk = [point]
+        for _ in range(size - 1):
+            # G has Z == 1, so this is a mixed addition
+            point = jacobian_add(point, g)
+            chunk.append(point)
+        chunk = jacobian_normalize_many(chunk)
+        for h160 in hash160_many([_sec(x, y, compressed) for x, y, _ in chunk]):
+            yield secret, encode_base58_checksum(prefix + h160)
+            secret += 1
+        point = jacobian_add(chunk[-1], g)
+
+
+def _search_segment(args):
+    prefixes, start, count, compressed, testnet = args
+    return [(secret, address) for secret, address
+            in address_range(start, count, compressed, testnet)
+            if address.startswith(prefixes)]
+
+
+def find_prefixes(prefixes, start, count, workers=None, segment_size=2**16,
+                  compressed=True, testnet=False, limit=None):
+    """
+    Returns (secret, address) pairs in secret order for every secret in
+    [start, start + count) whose address starts with one of prefixes (a
+    string or a tuple of strings). The range is cut into segment_size pieces
+    that run in a pool of workers processes; once limit matches are found
+    the remaining segments are dropped.
+    """
+    if isinstance(prefixes, str):
+        prefixes = (prefixes,)
+    prefixes = tuple(prefixes)
+    if start < 1 or start + count > N:
+        raise ValueError('secrets have to be in [1, N)')
+    segments = [(prefixes, s, min(segment_size, start + count - s), compressed, testnet)
+                for s in range(start, start + count, segment_size)]
+    matches = []
+    with Pool(workers or os.cpu_count() or 1) as pool:
+        for found in pool.imap(_search_segment, segments):
+            matches.extend(found)
+            if limit is not None and len(matches) >= limit:
+                return matches[:limit]
+    return matches
+
+
+class VanityTest(TestCase):
+
+    def test_address_range(self):
+        for start, compressed, testnet in ((1, True, False), (N - 6, False, True),
+                                           (0xcafe, True, True)):
+            expected = [(secret, PrivateKey(secret).point.address(compressed, testnet))
+                        for secret in range(start, start + 5)]
+            result = list(address_range(start, 5, compressed, testnet, chunk_size=2))
+            self.assertEqual(result, expected)
+        with self.assertRaises(ValueError):
+            list(address_range(N - 2, 5))
+
+    def test_find_prefixes(self):
+        addresses = list(address_range(1000, 300))
+        expected = [pair for pair in addresses if pair[1].startswith(('1A', '1B'))]
+        self.assertTrue(expected)
+        self.assertEqual(find_prefixes(('1A', '1B'), 1000, 300, workers=2,
+                                       segment_size=64), expected)
+        first = [pair for pair in expected if pair[1].startswith('1A')][:1]
+        self.assertEqual(find_prefixes('1A', 1000, 300, workers=2, segment_size=64,
+                                       limit=1), first)
@@ -0,0 +1,189 @@
+"""
+NumPy versions of the small-field curve operations from ecc.py, working on
+whole arrays of field elements at once. This is meant for the toy curves
+from the book (y^2 = x^3 + 7 over F_223 and friends), where we want to
+enumerate every point or add thousands of points in one go.
+
+Elements are int64 arrays with values in [0, prime). The prime has to be
+below 2^31 so that a product of two elements still fits in an int64. Points
+are pairs of x and y arrays, and the point at infinity is stored as
+x = y = INFINITY.
+"""
+from unittest import TestCase, skipIf
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ecc.ecc import FieldElement, Point
+
+INFINITY = -1
+
+
+class ToyCurve:
+    """The curve y^2 = x^3 + ax + b over F_prime, with vectorized arithmetic"""
+
+    def __init__(self, a, b, prime):
+        if np is None:
+            raise ImportError('the vectorized toolkit needs numpy')
+        if not 2 < prime < 2**31:
+            raise ValueError('prime {} is not in the range 3 to 2^31'.format(prime))
+        self.a = a % prime
+        self.b = b % prime
+        self.prime = prime
+
+    def __repr__(self):
+        return 'ToyCurve(y^2 = x^3 + {}x + {} over F_{})'.format(
+            self.a, self.b, self.prime)
+
+    def array(self, values):
+        """Converts values to an int64 array of field elements"""
+        return np.asarray(values, dtype=np.int64) % self.prime
+
+    def add(self, x, y):
+        return (x + y) % self.prime
+
+    def sub(self, x, y):
+        return (x - y) % self.prime
+
+    def mul(self, x, y):
+        return x * y % self.prime
+
+    def pow(self, x, exponent):
+        """Raises every element of x to the same non-negative exponent"""
+        result = np.ones_like(x)
+        base = np.array(x, dtype=np.int64)
+        while exponent:
+            if exponent & 1:
+                result = result * base % self.prime
+            base = base * base % self.prime
+            exponent >>= 1
+        return result
+
+    def inverse(self, x):
+        """Elementwise inverse by Fermat's little theorem; 0 maps to 0"""
+        return self.pow(x, self.prime - 2)
+
+    def rhs(self, x):
+        """x^3 + ax + b for every element of x"""
+        return (self.mul(self.mul(x, x), x) + self.a * x + self.b) % self.prime
+
+    def on_curve(self, x, y):
+        """
+        Boolean mask of which (x, y) are on the curve. x and y broadcast, so
+        on_curve(xs[:, None], ys[None, :]) checks a whole grid.
+        """
+        return self.mul(y, y) == self.rhs(x)
+
+    def points(self):
+        """
+        Returns (x, y) arrays with every affine point on the curve, sorted by
+        x then y. Each x is matched against a table of squares, so this is
+        O(p log p) instead of checking all p^2 pairs.
+        """
+        ys = np.arange(self.prime, dtype=np.int64)
+        squares = self.mul(ys, ys)
+        order = np.argsort(squares, kind='stable')
+        sorted_squares = squares[order]
+        rhs = self.rhs(np.arange(self.prime, dtype=np.int64))
+        start = np.searchsorted(sorted_squares, rhs, side='left')
+        end = np.searchsorted(sorted_squares, rhs, side='right')
+        # every nonzero square has two roots and 0 has one
+        counts = end - start
+        x = np.repeat(np.arange(self.prime, dtype=np.int64), counts)
+        offsets = np.arange(len(x)) - np.repeat(np.cumsum(counts) - counts, counts)
+        y = order[np.repeat(start, counts) + offsets]
+        return x, y
+
+    def point_add(self, x1, y1, x2, y2):
+        """Adds two arrays of points elementwise, handling infinity and doubling"""
+        x1, y1, x2, y2 = np.broadcast_arrays(*(np.asarray(v, dtype=np.int64)
+                                               for v in (x1, y1, x2, y2)))
+        inf1 = x1 == INFINITY
+        inf2 = x2 == INFINITY
+        same_x = (x1 == x2) & ~inf1 & ~inf2
+        doubling = same_x & (y1 == y2) & (y1 != 0)
+        vertical = same_x & ~doubling
+        # slope is (y2 - y1)/(x2 - x1), or (3x1^2 + a)/(2y1) when doubling;
+        # vertical and infinite lanes get a dummy denominator of 1
+        numerator = np.where(doubling, (3 * self.mul(x1, x1) + self.a) % self.prime,
+                             self.sub(y2, y1))
+        denominator = np.where(doubling, 2 * y1 % self.prime, self.sub(x2, x1))
+        denominator = np.where(vertical | inf1 | inf2, 1, denominator)
+        slope = self.mul(numerator, self.inverse(denominator))
+        x3 = (self.mul(slope, slope) - x1 - x2) % self.prime
+        y3 = self.sub(self.mul(slope, self.sub(x1, x3)), y1)
+        x3 = np.where(vertical, INFINITY, x3)
+        y3 = np.where(vertical, INFINITY, y3)
+        x3 = np.where(inf1, x2, np.where(inf2, x1, x3))
+        y3 = np.where(inf1, y2, np.where(inf2, y1, y3))
+        return x3, y3
+
+    def point_double(self, x, y):
+        return self.point_add(x, y, x, y)
+
+    def to_points(self, x, y):
+        """Converts point arrays into a list of ecc.Point objects"""
+        a = FieldElement(self.a, self.prime)
+        b = FieldElement(self.b, self.prime)
+        points = []
+        for x_raw, y_raw in zip(np.ravel(x).tolist(), np.ravel(y).tolist()):
+            if x_raw == INFINITY:
+                points.append(Point(None, None, a, b))
+            else:
+                points.append(Point(FieldElement(x_raw, self.prime),
+                                    FieldElement(y_raw, self.prime), a, b))
+        return points
+
+    def from_points(self, points):
+        """Converts a list of ecc.Point objects into (x, y) arrays"""
+        x = [INFINITY if p.x is None else p.x.num for p in points]
+        y = [INFINITY if p.y is None else p.y.num for p in points]
+        return np.array(x, dtype=np.int64), np.array(y, dtype=np.int64)
+
+
+@skipIf(np is None, 'numpy is not installed')
+class ToyCurveTest(TestCase):
+
+    def test_field(self):
+        curve = ToyCurve(0, 7, 31)
+        x = curve.array([2, 17, 24, 0])
+        y = curve.array([15, 21, 19, 5])
+        self.assertEqual(curve.add(x, y).tolist(), [17, 7, 12, 5])
+        self.assertEqual(curve.mul(x, y).tolist(), [30, 16, 22, 0])
+        self.assertEqual(curve.inverse(x).tolist(), [16, 11, 22, 0])
+        with self.assertRaises(ValueError):
+            ToyCurve(0, 7, 2**31 + 11)
+
+    def test_points(self):
+        prime = 223
+        curve = ToyCurve(0, 7, prime)
+        x, y = curve.points()
+        expected = [(i, j) for i in range(prime) for j in range(prime)
+                    if (j * j - i**3 - 7) % prime == 0]
+        self.assertEqual(list(zip(x.tolist(), y.tolist())), expected)
+        grid = curve.on_curve(np.arange(prime)[:, None], np.arange(prime)[None, :])
+        self.assertEqual(int(grid.sum()), len(expected))
+        self.assertTrue(curve.on_curve(curve.array([192]), curve.array([105]))[0])
+        self.assertFalse(curve.on_curve(curve.array([200]), curve.array([119]))[0])
+
+    def test_point_add(self):
+        curve = ToyCurve(0, 7, 223)
+        x, y = curve.points()
+        x = np.append(x, INFINITY)
+        y = np.append(y, INFINITY)
+        # every point against a shuffled copy, itself and its negation
+        shuffle = np.random.default_rng(1).permutation(len(x))
+        negated = np.where(y == INFINITY, INFINITY, (-y) % 223)
+        for x2, y2 in ((x[shuffle], y[shuffle]), (x, y), (x, negated)):
+            x3, y3 = curve.point_add(x, y, x2, y2)
+            expected = [p1 + p2 for p1, p2 in
+                        zip(curve.to_points(x, y), curve.to_points(x2, y2))]
+            self.assertEqual(curve.to_points(x3, y3), expected)
+        x3, y3 = curve.point_double(x, y)
+        self.assertEqual(curve.to_points(x3, y3),
+                         [p + p for p in curve.to_points(x, y)])
+        points = curve.to_points(x[:5], y[:5])
+        x4, y4 = curve.from_points(points)
+        self.assertEqual(x4.tolist(), x[:5].tolist())
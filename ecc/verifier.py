@@ -0,0 +1,132 @@
+"""
+Signature verification spread over a process pool. verify is pure Python
+and holds the GIL, so one process only ever uses one core. VerifyExecutor
+keeps a pool of workers that have the generator tables built at startup,
+hands them (sec, der, z) jobs in chunks and yields the results in the order
+the jobs came in.
+
+    with VerifyExecutor(workers=32) as executor:
+        for ok in executor.map(jobs):
+            ...
+"""
+import os
+from multiprocessing import Pool
+from random import randint
+from unittest import TestCase
+
+from ecc.ecc import (
+    batch_verify,
+    generator_odd_multiples,
+    generator_table,
+    N,
+    PrivateKey,
+    S256Point,
+    Signature,
+)
+
+
+def _init_worker():
+    # a forked worker inherits the parent's tables and this is a no-op,
+    # a spawned one builds them here once instead of on its first job
+    generator_table()
+    generator_odd_multiples()
+
+
+def _parse_job(job):
+    """Returns (point, z, sig) for a (sec, der, z) job, or None if it does not parse"""
+    sec, der, z = job
+    try:
+        return S256Point.parse(sec), z, Signature.parse(der)
+    except (ValueError, RuntimeError, IndexError):
+        return None
+
+
+def _verify_chunk(args):
+    jobs, batch = args
+    parsed = [_parse_job(job) for job in jobs]
+    if not batch:
+        return [item is not None and item[0].verify(item[1], item[2])
+                for item in parsed]
+    valid = [item for item in parsed if item is not None]
+    failed = set(batch_verify(valid))
+    results = []
+    i = 0
+    for item in parsed:
+        if item is None:
+            results.append(False)
+        else:
+            results.append(i not in failed)
+            i += 1
+    return results
+
+
+class VerifyExecutor:
+    """
+    A pool of workers processes (os.cpu_count() by default) verifying
+    (sec, der, z) jobs chunk_size at a time. With batch=True every chunk
+    goes through batch_verify instead of one verify per signature.
+    """
+
+    def __init__(self, workers=None, chunk_size=64, batch=False):
+        if chunk_size < 1:
+            raise ValueError('chunk_size has to be positive, not {}'.format(chunk_size))
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.batch = batch
+        # built before the fork so that workers share the parent's copy
+        _init_worker()
+        self.pool = Pool(self.workers, initializer=_init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def _chunks(self, jobs):
+        chunk = []
+        for job in jobs:
+            chunk.append(job)
+            if len(chunk) == self.chunk_size:
+                yield chunk, self.batch
+                chunk = []
+        if chunk:
+            yield chunk, self.batch
+
+    def map(self, jobs):
+        """Yields True or False for every (sec, der, z) in jobs, in order"""
+        for results in self.pool.imap(_verify_chunk, self._chunks(jobs)):
+            yield from results
+
+    def verify(self, jobs):
+        """Returns the list of results for jobs"""
+        return list(self.map(jobs))
+
+
+class VerifyExecutorTest(TestCase):
+
+    def test_verify(self):
+        jobs = []
+        expected = []
+        for i in range(20):
+            private_key = PrivateKey(randint(1, N - 1))
+            z = randint(0, 2**256)
+            der = private_key.sign(z).der()
+            sec = private_key.point.sec(compressed=i % 2 == 0)
+            if i % 5 == 3:
+                z += 1
+            jobs.append((sec, der, z))
+            expected.append(i % 5 != 3)
+        jobs.append((b'\x02' + b'\x00' * 32, jobs[0][1], jobs[0][2]))
+        jobs.append((jobs[0][0], b'\x30\x00', jobs[0][2]))
+        expected += [False, False]
+        for batch in (False, True):
+            with VerifyExecutor(workers=2, chunk_size=3, batch=batch) as executor:
+                self.assertEqual(executor.verify(jobs), expected)
+                self.assertEqual(list(executor.map([])), [])
+        with self.assertRaises(ValueError):
+            VerifyExecutor(chunk_size=0)
@@ -1,5 +1,8 @@
+from collections import deque
 import hashlib
-from unittest import TestSuite, TextTestRunner
+from multiprocessing import Pool
+from struct import pack, unpack
+from unittest import TestCase, TestSuite, TextTestRunner
 
 SIGHASH_ALL = 1
 BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
@@ -9,38 +12,261 @@ def run(test):
     suite.addTest(test)
     TextTestRunner().run(suite)
 
+def queued_results(pool, function, jobs, depth):
+    """
+    Runs function(*args) in pool for every (tag, args) in jobs and yields
+    (tag, result) in the order of jobs. depth calls are kept queued so the
+    workers never wait on the caller. Jobs are drawn lazily, so jobs may be
+    endless, and the calls still queued when jobs runs out are collected.
+    """
+    pending = deque()
+    for tag, args in jobs:
+        pending.append((tag, pool.apply_async(function, args)))
+        if len(pending) >= depth:
+            tag, result = pending.popleft()
+            yield tag, result.get()
+    while pending:
+        tag, result = pending.popleft()
+        yield tag, result.get()
+
+# RIPEMD-160 in pure Python, for OpenSSL 3 builds where the legacy provider
+# (and with it hashlib's ripemd160) is disabled. Both lines of the compression
+# function run side by side, one loop per round with the boolean function
+# written out, and the message words are unpacked with struct.
+_RMD_WORDS_LEFT = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15),
+    (7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8),
+    (3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12),
+    (1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2),
+    (4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13))
+_RMD_WORDS_RIGHT = (
+    (5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12),
+    (6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2),
+    (15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13),
+    (8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14),
+    (12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11))
+_RMD_SHIFTS_LEFT = (
+    (11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8),
+    (7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12),
+    (11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5),
+    (11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12),
+    (9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6))
+_RMD_SHIFTS_RIGHT = (
+    (8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6),
+    (9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11),
+    (9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5),
+    (15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8),
+    (8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11))
+# (word index, shift) pairs for each round of each line
+_RMD_LEFT = [tuple(zip(w, s)) for w, s in zip(_RMD_WORDS_LEFT, _RMD_SHIFTS_LEFT)]
+_RMD_RIGHT = [tuple(zip(w, s)) for w, s in zip(_RMD_WORDS_RIGHT, _RMD_SHIFTS_RIGHT)]
+_RMD_INITIAL = (0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476, 0xc3d2e1f0)
+_MASK32 = 0xffffffff
+
+def _ripemd160_compress(state, block):
+    """Runs the compression function on one 64-byte block"""
+    x = unpack('<16I', block)
+    m = _MASK32
+    al, bl, cl, dl, el = state
+    ar, br, cr, dr, er = state
+    # each step: t = rol(a + f(b, c, d) + x + k, s) + e, then
+    # a, b, c, d, e = e, t, b, rol(c, 10), d
+    for (i, s), (j, r) in zip(_RMD_LEFT[0], _RMD_RIGHT[0]):
+        t = (al + (bl ^ cl ^ dl) + x[i]) & m
+        al, el, dl, cl = el, dl, (cl << 10 | cl >> 22) & m, bl
+        bl = ((t << s | t >> (32 - s)) + al) & m
+        t = (ar + (br ^ (cr | dr ^ m)) + x[j] + 0x50a28be6) & m
+        ar, er, dr, cr = er, dr, (cr << 10 | cr >> 22) & m, br
+        br = ((t << r | t >> (32 - r)) + ar) & m
+    for (i, s), (j, r) in zip(_RMD_LEFT[1], _RMD_RIGHT[1]):
+        t = (al + ((bl & cl) | (bl ^ m) & dl) + x[i] + 0x5a827999) & m
+        al, el, dl, cl = el, dl, (cl << 10 | cl >> 22) & m, bl
+        bl = ((t << s | t >> (32 - s)) + al) & m
+        t = (ar + ((br & dr) | cr & (dr ^ m)) + x[j] + 0x5c4dd124) & m
+        ar, er, dr, cr = er, dr, (cr << 10 | cr >> 22) & m, br
+        br = ((t << r | t >> (32 - r)) + ar) & m
+    for (i, s), (j, r) in zip(_RMD_LEFT[2], _RMD_RIGHT[2]):
+        t = (al + ((bl | cl ^ m) ^ dl) + x[i] + 0x6ed9eba1) & m
+        al, el, dl, cl = el, dl, (cl << 10 | cl >> 22) & m, bl
+        bl = ((t << s | t >> (32 - s)) + al) & m
+        t = (ar + ((br | cr ^ m) ^ dr) + x[j] + 0x6d703ef3) & m
+        ar, er, dr, cr = er, dr, (cr << 10 | cr >> 22) & m, br
+        br = ((t << r | t >> (32 - r)) + ar) & m
+    for (i, s), (j, r) in zip(_RMD_LEFT[3], _RMD_RIGHT[3]):
+        t = (al + ((bl & dl) | cl & (dl ^ m)) + x[i] + 0x8f1bbcdc) & m
+        al, el, dl, cl = el, dl, (cl << 10 | cl >> 22) & m, bl
+        bl = ((t << s | t >> (32 - s)) + al) & m
+        t = (ar + ((br & cr) | (br ^ m) & dr) + x[j] + 0x7a6d76e9) & m
+        ar, er, dr, cr = er, dr, (cr << 10 | cr >> 22) & m, br
+        br = ((t << r | t >> (32 - r)) + ar) & m
+    for (i, s), (j, r) in zip(_RMD_LEFT[4], _RMD_RIGHT[4]):
+        t = (al + (bl ^ (cl | dl ^ m)) + x[i] + 0xa953fd4e) & m
+        al, el, dl, cl = el, dl, (cl << 10 | cl >> 22) & m, bl
+        bl = ((t << s | t >> (32 - s)) + al) & m
+        t = (ar + (br ^ cr ^ dr) + x[j]) & m
+        ar, er, dr, cr = er, dr, (cr << 10 | cr >> 22) & m, br
+        br = ((t << r | t >> (32 - r)) + ar) & m
+    h0, h1, h2, h3, h4 = state
+    return ((h1 + cl + dr) & m, (h2 + dl + er) & m, (h3 + el + ar) & m,
+            (h4 + al + br) & m, (h0 + bl + cr) & m)
+
+def ripemd160_python(s):
+    """RIPEMD-160 digest of s without OpenSSL"""
+    length = len(s)
+    s = bytes(s) + b'\x80' + b'\x00' * ((55 - length) % 64) + (8 * length).to_bytes(8, 'little')
+    state = _RMD_INITIAL
+    for i in range(0, len(s), 64):
+        state = _ripemd160_compress(state, s[i:i + 64])
+    return pack('<5I', *state)
+
+# the padding that turns a 32-byte sha256 digest into one RIPEMD-160 block
+_RMD_PAD_32 = b'\x80' + b'\x00' * 23 + (256).to_bytes(8, 'little')
+
+def set_ripemd160_backend(name):
+    """
+    Chooses 'openssl' or 'python' for ripemd160, hash160 and hash160_many.
+    'openssl' raises ValueError when hashlib does not have ripemd160.
+    """
+    global _RIPEMD160, RIPEMD160_BACKEND
+    if name == 'openssl':
+        _RIPEMD160 = hashlib.new('ripemd160')
+    elif name == 'python':
+        _RIPEMD160 = None
+    else:
+        raise ValueError('unknown RIPEMD-160 backend {}'.format(name))
+    RIPEMD160_BACKEND = name
+
+try:
+    set_ripemd160_backend('openssl')
+except ValueError:
+    set_ripemd160_backend('python')
+
+def ripemd160(s):
+    """RIPEMD-160 from OpenSSL when hashlib has it, in pure Python otherwise"""
+    if _RIPEMD160 is None:
+        return ripemd160_python(s)
+    h = _RIPEMD160.copy()
+    h.update(s)
+    return h.digest()
+
 def hash160(s):
-    return hashlib.new('ripemd160', hashlib.sha256(s).digest()).digest()
+    return ripemd160(hashlib.sha256(s).digest())
+
+def hash160_many(items):
+    """
+    hash160 of every bytes object in items. The OpenSSL path copies one
+    prepared hasher instead of looking up the algorithm per item, and the
+    Python path hashes each 32-byte sha256 digest as a single block.
+    """
+    sha256 = hashlib.sha256
+    if _RIPEMD160 is None:
+        initial = _RMD_INITIAL
+        compress = _ripemd160_compress
+        return [pack('<5I', *compress(initial, sha256(s).digest() + _RMD_PAD_32))
+                for s in items]
+    results = []
+    prototype = _RIPEMD160
+    for s in items:
+        h = prototype.copy()
+        h.update(sha256(s).digest())
+        results.append(h.digest())
+    return results
 
 def hash256(s):
     return hashlib.sha256(hashlib.sha256(s).digest()).digest()
 
+class SHA256Midstate:
+    """
+    The SHA-256 state after a fixed prefix. Hashing prefix + suffix for many
+    suffixes copies the state instead of compressing the prefix each time.
+    """
+
+    def __init__(self, prefix=b''):
+        self.state = hashlib.sha256(prefix)
+        self.length = len(prefix)
+
+    def extend(self, data):
+        """Returns a new midstate for prefix + data, leaving this one as is"""
+        midstate = SHA256Midstate.__new__(SHA256Midstate)
+        midstate.state = self.state.copy()
+        midstate.state.update(data)
+        midstate.length = self.length + len(data)
+        return midstate
+
+    def sha256(self, suffix=b''):
+        h = self.state.copy()
+        h.update(suffix)
+        return h.digest()
+
+    def hash256(self, suffix=b''):
+        """hash256(prefix + suffix)"""
+        h = self.state.copy()
+        h.update(suffix)
+        return hashlib.sha256(h.digest()).digest()
+
+    def hash256_many(self, suffixes):
+        """hash256(prefix + suffix) for every suffix in a list"""
+        state = self.state
+        sha256 = hashlib.sha256
+        results = []
+        for suffix in suffixes:
+            h = state.copy()
+            h.update(suffix)
+            results.append(sha256(h.digest()).digest())
+        return results
+
+# every pair of base58 digits, so encoding peels off two digits per divmod
+BASE58_PAIRS = [a + b for a in BASE58_ALPHABET for b in BASE58_ALPHABET]
+# reverse lookup from an ASCII code to its digit value, -1 if not base58
+BASE58_MAP = [-1] * 256
+for i, c in enumerate(BASE58_ALPHABET):
+    BASE58_MAP[ord(c)] = i
+del i, c
+
 def encode_base58(s):
-    count = 0
-    for c in s:
-        if c == 0:
-            count += 1
-        else:
-            break
-    num = int.from_bytes(s, 'big')
-    prefix = '1' * count
-    result = ''
+    """Encodes bytes of any length, each leading zero byte becomes a '1'"""
+    stripped = s.lstrip(b'\x00')
+    num = int.from_bytes(stripped, 'big')
+    digits = []
     while num > 0:
-        num, mod = divmod(num, 58)
-        result = BASE58_ALPHABET[mod] + result
-    return prefix + result
+        num, mod = divmod(num, 3364)
+        digits.append(BASE58_PAIRS[mod])
+    # the top pair can start with a zero digit, which is not a leading zero byte
+    result = ''.join(reversed(digits)).lstrip('1')
+    return '1' * (len(s) - len(stripped)) + result
 
-def decode_base58(s):
+def decode_base58_raw(s):
+    """Decodes a base58 string to bytes, the inverse of encode_base58"""
     num = 0
-    for c in s:
-        num *= 58
-        num+= BASE58_ALPHABET.index(c)
-    combined = num.to_bytes(25, byteorder='big')
-    checksum = combined[-4:]
-    if hash256(combined[:-4])[:4] != checksum:
-        raise ValueError('bad address: {} {}'.format(checksum,
-                                                     hash256(combined[:-4])[:4]))
-    return combined[1:-4]
+    try:
+        for c in s.encode('ascii'):
+            value = BASE58_MAP[c]
+            if value < 0:
+                raise ValueError
+            num = num * 58 + value
+    except (ValueError, UnicodeEncodeError):
+        raise ValueError('invalid base58 string: {}'.format(s))
+    zeros = len(s) - len(s.lstrip('1'))
+    return b'\x00' * zeros + num.to_bytes((num.bit_length() + 7) // 8, 'big')
+
+def decode_base58_checksum(s):
+    """Checks the 4-byte checksum and returns the data before it"""
+    combined = decode_base58_raw(s)
+    if len(combined) < 4 or hash256(combined[:-4])[:4] != combined[-4:]:
+        raise ValueError('bad checksum in {}'.format(s))
+    return combined[:-4]
+
+def decode_base58(s):
+    """Returns the payload of a Base58Check address without the version byte"""
+    return decode_base58_checksum(s)[1:]
+
+def encode_many(payloads):
+    """Base58Check encodes every payload in a list"""
+    return [encode_base58(b + hash256(b)[:4]) for b in payloads]
+
+def decode_many(strings):
+    """Decodes a list of Base58Check strings, checksums included"""
+    return [decode_base58_checksum(s) for s in strings]
 
 def p2pkh_script(h160):
     return Script([0x76, 0xa9, h160, 0x88, 0xac])
@@ -91,6 +317,192 @@ def h160_to_p2sh_address(h160, testnet=False):
     prefix = b'\xc4' if testnet else b'\x05'
     return encode_base58_checksum(prefix + h160)
 
+BECH32_ALPHABET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+# A string of 5-bit values is handled as one int with 5 bits per value. Bech32
+# characters become base-32 digits with bytes.translate and then an int with
+# int(digits, 32), both in C. Characters outside the alphabet turn into '!',
+# which int() rejects.
+_BASE32_DIGITS = b'0123456789abcdefghijklmnopqrstuv'
+_BECH32_TO_DIGITS = bytearray(b'!' * 256)
+for i, c in enumerate(BECH32_ALPHABET.encode()):
+    _BECH32_TO_DIGITS[c] = _BASE32_DIGITS[i]
+_BECH32_TO_DIGITS = bytes(_BECH32_TO_DIGITS)
+del i, c
+_VALUES_TO_DIGITS = bytes.maketrans(bytes(range(32)), _BASE32_DIGITS)
+# every pair of characters, so encoding emits 10 bits per lookup
+BECH32_PAIRS = [a + b for a in BECH32_ALPHABET for b in BECH32_ALPHABET]
+
+# BECH32_GENERATORS[b] is the xor of the BCH generators picked by the 5 bits
+# of b, which is what one step adds for the 5 bits shifted out of the state
+BECH32_GENERATORS = [0] * 32
+for i, generator in enumerate((0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)):
+    for b in range(32):
+        if b >> i & 1:
+            BECH32_GENERATORS[b] ^= generator
+del i, generator, b
+
+def _bech32_step(chk, value):
+    return (chk & 0x1ffffff) << 5 ^ value ^ BECH32_GENERATORS[chk >> 25]
+
+# The polymod is linear, so three steps are the low 15 bits of the state
+# shifted by 15, xor the next three values, xor a table entry for the top 15
+# bits. Each entry is the xor of the entries for its set bits.
+BECH32_TABLE = [0] * 2**15
+for i in range(15):
+    BECH32_TABLE[1 << i] = _bech32_step(_bech32_step(_bech32_step(1 << (i + 15), 0), 0), 0)
+for top in range(1, 2**15):
+    low = top & -top
+    BECH32_TABLE[top] = BECH32_TABLE[top ^ low] ^ BECH32_TABLE[low]
+del i, top, low
+_BECH32_HRP_STATES = {}
+
+def _polymod_int(num, count, chk):
+    """Runs the checksum over the count 5-bit values packed into num"""
+    shift = 5 * count
+    for _ in range(count % 3):
+        shift -= 5
+        chk = _bech32_step(chk, num >> shift & 31)
+    table = BECH32_TABLE
+    while shift:
+        shift -= 15
+        chk = (chk & 0x7fff) << 15 ^ (num >> shift & 0x7fff) ^ table[chk >> 15]
+    return chk
+
+def _pack(values):
+    """Packs a sequence of 5-bit values into an int"""
+    values = bytes(values)
+    return int(values.translate(_VALUES_TO_DIGITS), 32) if values else 0
+
+def bech32_polymod(values, chk=1):
+    """Runs the Bech32 checksum over a sequence of 5-bit values"""
+    return _polymod_int(_pack(values), len(values), chk)
+
+def bech32_hrp_expand(hrp):
+    return [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+
+def _hrp_state(hrp):
+    """The polymod state after the expanded hrp, cached for the first few hrps"""
+    state = _BECH32_HRP_STATES.get(hrp)
+    if state is None:
+        state = bech32_polymod(bech32_hrp_expand(hrp))
+        if len(_BECH32_HRP_STATES) < 16:
+            _BECH32_HRP_STATES[hrp] = state
+    return state
+
+def _bech32_string(hrp, num, count, const):
+    """Appends the checksum to count packed values and spells them out"""
+    num <<= 30
+    count += 6
+    num |= _polymod_int(num, count, _hrp_state(hrp)) ^ const
+    odd = count % 2
+    head = BECH32_ALPHABET[num >> 5 * (count - 1)] if odd else ''
+    pairs = [BECH32_PAIRS[num >> shift & 1023]
+             for shift in range(5 * (count - odd) - 10, -1, -10)]
+    return hrp + '1' + head + ''.join(pairs)
+
+def bech32_encode(hrp, data, const=BECH32_CONST):
+    """Encodes a sequence of 5-bit values with the human readable part hrp"""
+    return _bech32_string(hrp, _pack(data), len(data), const)
+
+def _bech32_unpack(s):
+    """Returns (hrp, packed values, count, const) for a Bech32(m) string"""
+    try:
+        raw = s.encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError('invalid bech32 string: {}'.format(s))
+    if not raw or len(raw) > 90 or min(raw) < 33 or max(raw) > 126 \
+            or (s.lower() != s and s.upper() != s):
+        raise ValueError('invalid bech32 string: {}'.format(s))
+    raw = raw.lower()
+    pos = raw.rfind(b'1')
+    if pos < 1 or pos + 7 > len(raw):
+        raise ValueError('invalid bech32 separator: {}'.format(s))
+    hrp = raw[:pos].decode('ascii')
+    try:
+        num = int(raw[pos + 1:].translate(_BECH32_TO_DIGITS), 32)
+    except ValueError:
+        raise ValueError('invalid bech32 character: {}'.format(s))
+    count = len(raw) - pos - 1
+    const = _polymod_int(num, count, _hrp_state(hrp))
+    if const not in (BECH32_CONST, BECH32M_CONST):
+        raise ValueError('bad bech32 checksum: {}'.format(s))
+    return hrp, num >> 30, count - 6, const
+
+def bech32_decode(s):
+    """
+    Returns (hrp, data, const) for a Bech32 or Bech32m string, with data as
+    bytes of 5-bit values and const saying which checksum matched
+    """
+    hrp, num, count, const = _bech32_unpack(s)
+    return hrp, bytes(num >> 5 * i & 31 for i in range(count - 1, -1, -1)), const
+
+def convert_bits(data, from_bits, to_bits, pad=True):
+    """Regroups a sequence of from_bits-bit values into to_bits-bit values"""
+    acc = 0
+    bits = 0
+    result = []
+    max_value = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits | value) & 0xffffffff
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append(acc >> bits & max_value)
+    if pad:
+        if bits:
+            result.append(acc << (to_bits - bits) & max_value)
+    elif bits >= from_bits or acc << (to_bits - bits) & max_value:
+        raise ValueError('invalid padding')
+    return result
+
+def encode_segwit_address(hrp, version, program):
+    """Witness version 0 uses Bech32 and later versions Bech32m (BIP350)"""
+    const = BECH32_CONST if version == 0 else BECH32M_CONST
+    # the program is padded with zero bits to a whole number of 5-bit values
+    count = (len(program) * 8 + 4) // 5
+    num = version << 5 * count | int.from_bytes(program, 'big') << (5 * count - 8 * len(program))
+    return _bech32_string(hrp, num, count + 1, const)
+
+def decode_segwit_address(hrp, address):
+    """Returns (version, program) of a segwit address for the given hrp"""
+    decoded_hrp, num, count, const = _bech32_unpack(address)
+    if decoded_hrp != hrp or count < 1:
+        raise ValueError('not a {} address: {}'.format(hrp, address))
+    bits = 5 * (count - 1)
+    version = num >> bits
+    padding = bits % 8
+    # at most 4 bits of padding, and they have to be zero
+    if padding > 4 or num & ((1 << padding) - 1):
+        raise ValueError('invalid padding in {}'.format(address))
+    program = (num >> padding & ((1 << bits - padding) - 1)).to_bytes(bits // 8, 'big')
+    if version > 16 or not 2 <= len(program) <= 40 \
+            or (version == 0 and len(program) not in (20, 32)):
+        raise ValueError('invalid witness program in {}'.format(address))
+    if const != (BECH32_CONST if version == 0 else BECH32M_CONST):
+        raise ValueError('wrong checksum variant for version {}: {}'.format(version, address))
+    return version, program
+
+def segwit_hrp(testnet=False):
+    return 'tb' if testnet else 'bc'
+
+def h160_to_p2wpkh_address(h160, testnet=False):
+    return encode_segwit_address(segwit_hrp(testnet), 0, h160)
+
+def h256_to_p2wsh_address(h256, testnet=False):
+    return encode_segwit_address(segwit_hrp(testnet), 0, h256)
+
+def encode_segwit_many(programs, testnet=False):
+    """Encodes a list of (version, program) pairs as addresses"""
+    hrp = segwit_hrp(testnet)
+    return [encode_segwit_address(hrp, version, program) for version, program in programs]
+
+def decode_segwit_many(addresses, testnet=False):
+    """Decodes a list of segwit addresses to (version, program) pairs"""
+    hrp = segwit_hrp(testnet)
+    return [decode_segwit_address(hrp, address) for address in addresses]
+
 def target_to_bits(target):
     raw_bytes = target.to_bytes(32, 'big')
     raw_bytes = raw_bytes.lstrip(b'\x00')
@@ -102,3 +514,88 @@ def target_to_bits(target):
         coefficient = raw_bytes[:3]
     new_bits = coefficient[::-1] + bytes([exponent])
     return new_bits
+
+
+class HelperTest(TestCase):
+
+    def test_base58(self):
+        h160 = bytes.fromhex('74d691da1574e6b3c192ecfb52cc8984ee7b6c56')
+        addr = h160_to_p2pkh_address(h160, testnet=True)
+        self.assertEqual(addr, 'mrAjisaT4LXL5MzE81sfcDYKU3wqWSvf9q')
+        self.assertEqual(decode_base58(addr), h160)
+        self.assertEqual(encode_base58(bytes.fromhex('0000287fb4cd')), '11233QC4')
+        for raw in (b'', b'\x00', b'\x00\x00\x01', b'\x01\x00', bytes(range(100))):
+            self.assertEqual(decode_base58_raw(encode_base58(raw)), raw)
+        payloads = [b'\x00' * 3 + bytes([i]) * i for i in range(40)]
+        strings = encode_many(payloads)
+        self.assertEqual(strings, [encode_base58_checksum(b) for b in payloads])
+        self.assertEqual(decode_many(strings), payloads)
+        with self.assertRaises(ValueError):
+            decode_base58(addr[:-1] + 'r')
+        with self.assertRaises(ValueError):
+            decode_base58_raw('0OIl')
+
+    def test_queued_results(self):
+        jobs = [(i, (2, i)) for i in range(10)]
+        with Pool(2) as pool:
+            for depth in (1, 4, 20):
+                self.assertEqual(list(queued_results(pool, pow, iter(jobs), depth)),
+                                 [(i, 2**i) for i in range(10)])
+
+    def test_midstate(self):
+        prefix = bytes(range(100))
+        suffixes = [bytes([i]) * i for i in range(20)]
+        midstate = SHA256Midstate(prefix)
+        self.assertEqual(midstate.hash256(), hash256(prefix))
+        self.assertEqual(midstate.sha256(b'x'), hashlib.sha256(prefix + b'x').digest())
+        self.assertEqual(midstate.hash256_many(suffixes),
+                         [hash256(prefix + suffix) for suffix in suffixes])
+        extended = midstate.extend(b'abc')
+        self.assertEqual(extended.length, 103)
+        self.assertEqual(extended.hash256(b'd'), hash256(prefix + b'abcd'))
+        self.assertEqual(midstate.hash256(b'd'), hash256(prefix + b'd'))
+
+    def test_ripemd160(self):
+        vectors = (
+            (b'', '9c1185a5c5e9fc54612808977ee8f548b2258d31'),
+            (b'abc', '8eb208f7e05d987a9b044a8e98c6b087f15a0bfc'),
+            (b'message digest', '5d0689ef49d2fae572b881b123a85ffa21595f36'),
+            (b'1234567890' * 8, '9b752e45573d4b39f4dbd3323cab82bf63326bfb'),
+        )
+        for message, digest in vectors:
+            self.assertEqual(ripemd160_python(message).hex(), digest)
+        items = [bytes(range(i)) for i in range(70)]
+        expected = [ripemd160_python(hashlib.sha256(s).digest()) for s in items]
+        original = RIPEMD160_BACKEND
+        try:
+            for name in ('openssl', 'python'):
+                try:
+                    set_ripemd160_backend(name)
+                except ValueError:
+                    continue
+                self.assertEqual(ripemd160(b'abc').hex(), vectors[1][1])
+                self.assertEqual([hash160(s) for s in items], expected)
+                self.assertEqual(hash160_many(items), expected)
+        finally:
+            set_ripemd160_backend(original)
+
+    def test_bech32(self):
+        h160 = bytes.fromhex('751e76e8199196d454941c45d1b3a323f1433bd6')
+        addr = 'bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4'
+        self.assertEqual(h160_to_p2wpkh_address(h160), addr)
+        self.assertEqual(decode_segwit_address('bc', addr.upper()), (0, h160))
+        h256 = bytes.fromhex('1863143c14c5166804bd19203356da136c985678cd4d27a1b8c6329604903262')
+        self.assertEqual(h256_to_p2wsh_address(h256, testnet=True),
+                         'tb1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3q0sl5k7')
+        # a version 1 program is Bech32m
+        program = bytes.fromhex('79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798')
+        taproot = 'bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0'
+        self.assertEqual(encode_segwit_address('bc', 1, program), taproot)
+        self.assertEqual(bech32_decode(taproot)[2], BECH32M_CONST)
+        programs = [(0, h160), (0, h256), (1, program)]
+        self.assertEqual(decode_segwit_many(encode_segwit_many(programs)), programs)
+        for bad in (addr[:-1] + '5', addr.replace('q', 'Q', 1), 'tb1' + addr[3:],
+                    # version 0 program with a Bech32m checksum
+                    bech32_encode('bc', [0] + convert_bits(h160, 8, 5), BECH32M_CONST)):
+            with self.assertRaises(ValueError):
+                decode_segwit_address('bc', bad)
@@ -0,0 +1,226 @@
+"""
+Nonce search for Block headers. The 80-byte header splits into the first
+64 bytes (version, prev_block and most of merkle_root), which are one
+SHA-256 block, and a 16-byte tail (end of merkle_root, timestamp, bits,
+nonce). Workers hash from a midstate of the first 64 bytes, so each try
+only compresses the tail.
+
+The search space is cut into work units of chunk_size nonces. Nonces are
+tried first, then the timestamp is rolled forward up to max_time_roll
+seconds, and then the extranonce moves on, which needs a new merkle root
+and with it a new midstate. Units are handed to a process pool and the
+search stops at the first solution.
+"""
+import os
+import time
+from multiprocessing import Pool, RawValue
+from unittest import TestCase
+
+from block import Block
+from helper import (
+    hash256,
+    int_to_little_endian,
+    queued_results,
+    SHA256Midstate,
+)
+
+REGTEST_BITS = bytes.fromhex('ffff7f20')
+NONCE_SPACE = 2**32
+# nonces between checks for a newer search in the pool
+CHECK_INTERVAL = 4096
+
+# the search generation shared with the pool, None in the parent process
+_generation = None
+
+
+def _init_worker(generation):
+    global _generation
+    _generation = generation
+
+
+def _search(unit):
+    """
+    Tries nonces [start, start + count) for one serialized header, hashing
+    only the tail after the header's midstate. A unit queued for an older
+    search generation stops early. Returns (nonce or None, hashes tried,
+    seconds).
+    """
+    header, target, start, count, generation = unit
+    start_time = time.perf_counter()
+    hash256 = SHA256Midstate(header[:64]).hash256
+    tail = header[64:76]
+    end = start + count
+    for check in range(start, end, CHECK_INTERVAL):
+        if _generation is not None and _generation.value != generation:
+            return None, check - start, time.perf_counter() - start_time
+        for nonce in range(check, min(check + CHECK_INTERVAL, end)):
+            if int.from_bytes(hash256(tail + nonce.to_bytes(4, 'little')), 'little') < target:
+                return nonce, nonce - start + 1, time.perf_counter() - start_time
+    return None, count, time.perf_counter() - start_time
+
+
+class Miner:
+    """
+    Searches for valid headers with a pool of workers processes
+    (os.cpu_count() by default). The first unit of every search runs in
+    this process, so low-difficulty blocks never touch the pool. The pool
+    lives until close(); units still queued when a search ends see the
+    generation move on and stop.
+    """
+
+    def __init__(self, workers=None, chunk_size=2**16, max_time_roll=600):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_time_roll = max_time_roll
+        self.pool = None
+        self.generation = None
+        self.stats = {'hashes': 0, 'seconds': 0.0, 'worker_seconds': 0.0, 'blocks': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.generation = None
+
+    def _units(self, block, merkle_root):
+        """
+        Yields (header fields, work unit) over extranonce, timestamp and nonce.
+        Without merkle_root it stops after the last timestamp.
+        """
+        target = block.bits_to_target()
+        generation = 0 if self.generation is None else self.generation.value
+        extranonce = 0
+        while True:
+            root = block.merkle_root if merkle_root is None else merkle_root(extranonce)
+            for timestamp in range(block.timestamp, block.timestamp + self.max_time_roll + 1):
+                header = Block(block.version, block.prev_block, root, timestamp,
+                               block.bits, b'\x00' * 4).serialize()
+                for start in range(0, NONCE_SPACE, self.chunk_size):
+                    count = min(self.chunk_size, NONCE_SPACE - start)
+                    yield (root, timestamp), (header, target, start, count, generation)
+            if merkle_root is None:
+                return
+            extranonce += 1
+
+    def mine(self, block, merkle_root=None):
+        """
+        Returns a copy of block with a nonce (and if needed timestamp and
+        merkle root) that meets its target. merkle_root, if given, maps an
+        extranonce to the merkle root of the block with that extranonce.
+        """
+        start_time = time.perf_counter()
+        units = self._units(block, merkle_root)
+        fields, unit = next(units)
+        nonce, hashes, seconds = _search(unit)
+        self.stats['hashes'] += hashes
+        self.stats['worker_seconds'] += seconds
+        if nonce is None:
+            fields, nonce = self._mine_parallel(units)
+        root, timestamp = fields
+        self.stats['seconds'] += time.perf_counter() - start_time
+        self.stats['blocks'] += 1
+        return Block(block.version, block.prev_block, root, timestamp, block.bits,
+                     int_to_little_endian(nonce, 4))
+
+    def _mine_parallel(self, units):
+        if self.pool is None:
+            self.generation = RawValue('L', 0)
+            self.pool = Pool(self.workers, initializer=_init_worker,
+                             initargs=(self.generation,))
+        jobs = ((fields, (unit,)) for fields, unit in units)
+        for fields, (nonce, hashes, seconds) in queued_results(
+                self.pool, _search, jobs, 2 * self.workers):
+            self.stats['hashes'] += hashes
+            self.stats['worker_seconds'] += seconds
+            if nonce is not None:
+                # the units still queued cannot win any more, let them stop
+                self.generation.value += 1
+                return fields, nonce
+        raise RuntimeError('nonce and timestamp space exhausted; '
+                           'pass merkle_root to roll the extranonce')
+
+    def hash_rate(self):
+        """Hashes per second of wall-clock time over every search so far"""
+        return self.stats['hashes'] / max(self.stats['seconds'], 1e-9)
+
+    def hash_rate_per_core(self):
+        """Hashes per second of time spent hashing, in the pool or in this process"""
+        return self.stats['hashes'] / max(self.stats['worker_seconds'], 1e-9)
+
+
+def mine_chain(count, prev_block=b'\x00' * 32, bits=REGTEST_BITS, timestamp=None,
+               version=0x20000000, miner=None):
+    """
+    Mines count blocks, each on top of the one before. Blocks carry no
+    transactions, so the merkle root is a stand-in derived from the height.
+    """
+    if timestamp is None:
+        timestamp = int(time.time())
+    own_miner = miner is None
+    if own_miner:
+        miner = Miner()
+    blocks = []
+    try:
+        for height in range(count):
+            merkle_root = hash256(int_to_little_endian(height, 4))
+            block = miner.mine(Block(version, prev_block, merkle_root,
+                                     timestamp + height, bits, b'\x00' * 4))
+            blocks.append(block)
+            prev_block = block.hash()
+    finally:
+        if own_miner:
+            miner.close()
+    return blocks
+
+
+class MinerTest(TestCase):
+
+    def test_mine_chain(self):
+        blocks = mine_chain(200, timestamp=1500000000)
+        self.assertEqual(len(blocks), 200)
+        for prev, block in zip(blocks, blocks[1:]):
+            self.assertEqual(block.prev_block, prev.hash())
+        for block in blocks:
+            self.assertTrue(block.check_pow())
+
+    def test_parallel(self):
+        # about 2^12 hashes per solution against 2^8 nonces per unit
+        bits = bytes.fromhex('ffff0f1f')
+        block = Block(0x20000000, b'\x11' * 32, b'\x22' * 32, 1500000000, bits, b'\x00' * 4)
+        with Miner(workers=2, chunk_size=256) as miner:
+            mined = miner.mine(block)
+        self.assertTrue(mined.check_pow())
+        self.assertEqual(mined.prev_block, block.prev_block)
+        self.assertGreater(miner.hash_rate_per_core(), 0)
+
+    def test_pool_reuse(self):
+        bits = bytes.fromhex('ffff0f1f')
+        with Miner(workers=2, chunk_size=256) as miner:
+            pools = set()
+            for prev in range(1, 6):
+                block = Block(0x20000000, bytes([prev]) * 32, b'\x22' * 32, 1500000000,
+                              bits, b'\x00' * 4)
+                self.assertTrue(miner.mine(block).check_pow())
+                pools.add(id(miner.pool))
+            self.assertEqual(len(pools - {id(None)}), 1)
+            # units left over from an older search stop at once
+            header = block.serialize()
+            stale = miner.pool.apply(_search, ((header, 0, 0, 2**20, -1),))
+            self.assertEqual(stale[:2], (None, 0))
+        self.assertIsNone(miner.pool)
+
+    def test_merkle_root(self):
+        block = Block(0x20000000, b'\x11' * 32, b'\x22' * 32, 1500000000,
+                      REGTEST_BITS, b'\x00' * 4)
+        roots = lambda extranonce: hash256(bytes([extranonce]))
+        with Miner(workers=1) as miner:
+            mined = miner.mine(block, merkle_root=roots)
+        self.assertTrue(mined.check_pow())
+        self.assertEqual(mined.merkle_root, roots(0))
@@ -1,8 +1,24 @@
 import hashlib
-
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+try:
+    from ecc.ecc import (
+        S256Point,
+        Signature,
+    )
+except ImportError:
+    # the chapter directories have ecc.py as a module, not the ecc package
+    from ecc import (
+        S256Point,
+        Signature,
+    )
 from helper import (
     hash160,
     hash256,
+    ripemd160,
 )
 
 
@@ -608,7 +624,7 @@ def op_ripemd160(stack):
     if len(stack) < 1:
         return False
     element = stack.pop()
-    stack.append(hashlib.new('ripemd160', element).digest())
+    stack.append(ripemd160(element))
     return True
 
 
@@ -682,13 +698,13 @@ def op_checkmultisig(stack, z):
         points = [S256Point.parse(sec) for sec in sec_pubkeys]
         sigs = [Signature.parse(der) for der in der_signatures]
         for sig in sigs:
-            if len(points) == 0:
-                print('signatures no good or not in right order')
-                return False
             while points:
                 point = points.pop(0)
                 if point.verify(z, sig):
                     break
+            else:
+                print('signatures no good or not in right order')
+                return False
         stack.append(encode_num(1))
     except (ValueError, SyntaxError):
         return False
@@ -914,3 +930,14 @@ OP_CODE_NAMES = {
     184: 'OP_NOP9',
     185: 'OP_NOP10',
 }
+
+
+class OpTest(TestCase):
+
+    def test_import_from_chapter(self):
+        root = os.path.dirname(os.path.realpath(__file__))
+        for chapter in ('ch05', 'ch10'):
+            result = subprocess.run([sys.executable, '-c', 'import op, script'],
+                                    cwd=os.path.join(root, chapter),
+                                    capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
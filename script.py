@@ -1,3 +1,11 @@
+from helper import (
+    encode_varint,
+    int_to_little_endian,
+    little_endian_to_int,
+    read_varint,
+)
+
+
 class Script:
     def __init__(self, cmds=None):
         if cmds is None:
@@ -35,7 +43,7 @@ class Script:
     def raw_serialize(self):
         result = b''
         for cmd in self.cmds:
-            if type(cmd) == nt:
+            if type(cmd) == int:
                 result += int_to_little_endian(cmd, 1)
             else:
                 length = len(cmd)
@@ -50,7 +58,7 @@ class Script:
                 else:
                     raise ValueError('too long of a cmd')
                 result += cmd
-            return result
+        return result
 
     def serialize(self):
         result = self.raw_serialize()
@@ -1,7 +1,16 @@
 import requests
 from io import BytesIO
-
-from helper import hash256, little_endian_to_int, read_varint, SIGHASH_ALL
+from unittest import TestCase
+
+from helper import (
+    encode_varint,
+    hash256,
+    int_to_little_endian,
+    little_endian_to_int,
+    read_varint,
+    SHA256Midstate,
+    SIGHASH_ALL,
+)
 from script import Script
 
 class Tx:
@@ -74,33 +83,61 @@ class Tx:
             out_sum += tx_out.amount
         return in_sum - out_sum
 
-    def sig_hash(self, input_index, redeem_script=None):
-        s = int_to_little_endian(self.version, 4)
-        s += encode_varint(len(self.tx_ins))
-        for i, tx in enumerate(self.tx_ins):
-            if i == input_index:
-                if redeem_script:
-                    script_sig = redeem_script
-                else:
-                    script_sig = tx_in.script_pubkey(self.testnet)
-            else:
-                script_sig = None
-            new_tx_in = TxIn(
-                prev_tx=tx_in.prev_tx,
-                prev_index=tx_in.prev_index,
-                script_sig=script_sig,
-                sequence=tx_in.sequence,
-            )
-            s += new_tx_in.serialize()
+    def sig_hash_midstates(self):
+        """
+        Returns, for every input, the SHA-256 state after the version and
+        the inputs before it with empty script_sigs. Those are the parts of
+        the legacy sighash preimage that inputs share, and they are built
+        incrementally so each one is only hashed once.
+        """
+        midstate = SHA256Midstate(
+            int_to_little_endian(self.version, 4) + encode_varint(len(self.tx_ins)))
+        midstates = []
+        for tx_in in self.tx_ins:
+            midstates.append(midstate)
+            midstate = midstate.extend(self._blank_tx_in(tx_in).serialize())
+        return midstates
+
+    def _sig_hash_prefix(self, input_index):
+        """The sighash preimage up to input_index, which is what its midstate hashes"""
+        prefix = int_to_little_endian(self.version, 4) + encode_varint(len(self.tx_ins))
+        for tx_in in self.tx_ins[:input_index]:
+            prefix += self._blank_tx_in(tx_in).serialize()
+        return prefix
+
+    def _blank_tx_in(self, tx_in, script_sig=None):
+        return TxIn(
+            prev_tx=tx_in.prev_tx,
+            prev_index=tx_in.prev_index,
+            script_sig=script_sig,
+            sequence=tx_in.sequence,
+        )
+
+    def sig_hash(self, input_index, redeem_script=None, midstate=None):
+        """
+        Legacy SIGHASH_ALL hash for an input. midstate is that input's entry
+        from sig_hash_midstates, when signing or verifying several inputs.
+        """
+        tx_in = self.tx_ins[input_index]
+        if redeem_script:
+            script_sig = redeem_script
+        else:
+            script_sig = tx_in.script_pubkey(self.testnet)
+        s = self._blank_tx_in(tx_in, script_sig).serialize()
+        for tx_in in self.tx_ins[input_index + 1:]:
+            s += self._blank_tx_in(tx_in).serialize()
         s += encode_varint(len(self.tx_outs))
         for tx_out in self.tx_outs:
             s += tx_out.serialize()
         s += int_to_little_endian(self.locktime, 4)
         s += int_to_little_endian(SIGHASH_ALL, 4)
-        h256 = hash256(s)
+        if midstate is None:
+            h256 = hash256(self._sig_hash_prefix(input_index) + s)
+        else:
+            h256 = midstate.hash256(s)
         return int.from_bytes(h256, 'big')
 
-    def verify_input(self, input_index):
+    def verify_input(self, input_index, midstate=None):
         tx_in = self.tx_ins[input_index]
         script_pubkey = tx_in.script_pubkey(self.testnet)
         if script_pubkey.is_p2sh_script_pubkey():
@@ -109,29 +146,34 @@ class Tx:
             redeem_script = Script.parse(BytesIO(raw_redeem))
         else:
             redeem_script = None
-        z = self.sig_hash(input_index, redeem_script)
+        z = self.sig_hash(input_index, redeem_script, midstate)
         combined_script = tx_in.script_sig + script_pubkey
         return combined_script.evaluate(z)
 
     def verify(self):
         if self.fee() < 0:
             return False
+        midstates = self.sig_hash_midstates()
         for i in range(len(self.tx_ins)):
-            if not self.verify_input(i):
+            if not self.verify_input(i, midstates[i]):
                 return False
         return True
 
-    def sign_input(self, input_index, private_key):
-        z = self.sig_hash(input_index)
+    def sign_input(self, input_index, private_key, midstate=None):
+        # script_sigs are blanked in the preimage, so one midstate serves
+        # both the signature and the check, before and after signing
+        if midstate is None:
+            midstate = SHA256Midstate(self._sig_hash_prefix(input_index))
+        z = self.sig_hash(input_index, midstate=midstate)
         der = private_key.sign(z).der()
         sig = der + SIGHASH_ALL.to_bytes(1, 'big')
         sec = private_key.sec()
         script_sig = Script([sig, sec])
         self.tx_ins[input_index].script_sig = script_sig
-        return self.verify_input(input_index)
+        return self.verify_input(input_index, midstate)
 
     def is_coinbase(self):
-        if len(self.tx_ins) != 1):
+        if len(self.tx_ins) != 1:
             return False
         if self.tx_ins[0].prev_tx != 0x00 * 32 \
                 or self.tx_ins[0].prev_tx != 0xffffffff:
@@ -243,3 +285,30 @@ class TxFetcher:
             cls.cache[tx_id] = tx
         cls.cache[tx_id].testnet = testnet
         return cls.cache[tx_id]
+
+
+class TxTest(TestCase):
+
+    def test_sig_hash_midstate(self):
+        tx_ins = [TxIn(bytes([i]) * 32, i, sequence=0xfffffffe - i) for i in range(4)]
+        tx_outs = [TxOut(amount, Script([0x76, 0xa9, bytes([amount % 256]) * 20, 0x88, 0xac]))
+                   for amount in (1000, 25000)]
+        tx = Tx(1, tx_ins, tx_outs, 0)
+        script = Script([0x76, 0xa9, b'\xab' * 20, 0x88, 0xac])
+        midstates = tx.sig_hash_midstates()
+        for index in range(len(tx_ins)):
+            # the whole preimage serialized in one go
+            s = int_to_little_endian(tx.version, 4) + encode_varint(len(tx_ins))
+            for i, tx_in in enumerate(tx_ins):
+                s += TxIn(tx_in.prev_tx, tx_in.prev_index,
+                          script if i == index else None, tx_in.sequence).serialize()
+            s += encode_varint(len(tx_outs))
+            for tx_out in tx_outs:
+                s += tx_out.serialize()
+            s += int_to_little_endian(tx.locktime, 4) + int_to_little_endian(SIGHASH_ALL, 4)
+            expected = int.from_bytes(hash256(s), 'big')
+            self.assertEqual(tx.sig_hash(index, script), expected)
+            self.assertEqual(tx.sig_hash(index, script, midstates[index]), expected)
+            # the midstate sign_input builds for a single input
+            midstate = SHA256Midstate(tx._sig_hash_prefix(index))
+            self.assertEqual(tx.sig_hash(index, script, midstate), expected)